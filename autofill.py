@@ -0,0 +1,364 @@
+"""
+Remplissage automatique de la liste d'attente.
+
+Quand la queue se vide, on choisit les pistes suivantes parmi l'historique
+local et les résultats de recherche récents, en les classant par similarité
+avec ce qui vient d'être joué. Les caractéristiques audio sont récupérées
+par lots, mises en cache localement, et tout le classement est vectorisé
+avec NumPy pour rester en quelques millisecondes sur des dizaines de
+milliers de candidats.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Caractéristiques audio utilisées, avec leur échelle approximative
+FEATURE_SCALES = {
+    'danceability': 1.0,
+    'energy': 1.0,
+    'valence': 1.0,
+    'acousticness': 1.0,
+    'instrumentalness': 1.0,
+    'speechiness': 1.0,
+    'liveness': 1.0,
+    'tempo': 200.0,
+    'loudness': 60.0,
+}
+FEATURE_KEYS = tuple(FEATURE_SCALES)
+
+
+class FeatureStore:
+    """
+    Cache local des caractéristiques audio (en mémoire et dans un fichier JSON)
+
+    Args:
+        fetcher: Fonction qui récupère les caractéristiques d'une liste d'IDs
+                 (par lots) et retourne un dict par ID, avec None pour les
+                 pistes sans caractéristiques ; les pistes sans réponse
+                 sont absentes
+        path: Fichier de cache, ou None pour ne rien écrire sur disque
+    """
+
+    RETRY_DELAY = 60.0        # Secondes avant de réessayer après un échec
+    MAX_RETRY_DELAY = 3600.0
+
+    def __init__(self, fetcher: Callable[[List[str]], Dict[str, Optional[Dict]]],
+                 path: Optional[str] = ".features_cache.json"):
+        self.fetcher = fetcher
+        self.path = path
+        self.vectors: Dict[str, List[float]] = {}
+        self.missing = set()  # Pistes sans caractéristiques côté API
+        self._retry_at = 0.0
+        self._retry_delay = self.RETRY_DELAY
+        self._lock = threading.Lock()
+        self._load()
+
+    def get(self, track_id: str) -> Optional[List[float]]:
+        with self._lock:
+            return self.vectors.get(track_id)
+
+    def ensure(self, track_ids: Iterable[str]) -> int:
+        """
+        Récupère les caractéristiques des pistes qui ne sont pas en cache
+
+        Returns:
+            Nombre de pistes nouvellement mises en cache
+        """
+        with self._lock:
+            if time.monotonic() < self._retry_at:
+                return 0
+            wanted = [track_id for track_id in dict.fromkeys(track_ids)
+                      if track_id not in self.vectors and track_id not in self.missing]
+        if not wanted:
+            return 0
+
+        features = self.fetcher(wanted)
+        added = 0
+        with self._lock:
+            for track_id in wanted:
+                if track_id not in features:
+                    continue  # Lot en échec ou jamais demandé : réessayé plus tard
+                item = features[track_id]
+                if item:
+                    self.vectors[track_id] = feature_vector(item)
+                    added += 1
+                else:
+                    # Le lot a répondu sans cette piste : inutile de redemander
+                    self.missing.add(track_id)
+            if len(features) < len(wanted):
+                # Échec (endpoint refusé, panne) : on espace les tentatives
+                self._retry_at = time.monotonic() + self._retry_delay
+                self._retry_delay = min(self._retry_delay * 2, self.MAX_RETRY_DELAY)
+            else:
+                self._retry_delay = self.RETRY_DELAY
+        if features:
+            self._save()
+        return added
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as cache_file:
+                self.vectors = json.load(cache_file)
+        except (OSError, ValueError) as e:
+            print(f"Cache des caractéristiques illisible, ignoré: {e}")
+
+    def _save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = json.dumps(self.vectors)
+        try:
+            with open(self.path, "w", encoding="utf-8") as cache_file:
+                cache_file.write(data)
+        except OSError as e:
+            print(f"Erreur lors de l'écriture du cache des caractéristiques: {e}")
+
+
+def feature_vector(features: Dict) -> List[float]:
+    """Convertit la réponse audio-features de l'API en vecteur normalisé"""
+    return [float(features.get(key) or 0.0) / scale for key, scale in FEATURE_SCALES.items()]
+
+
+class AutoFill:
+    """
+    Moteur de remplissage de la queue
+
+    Args:
+        store: Cache des caractéristiques audio
+        recent_fetcher: Fonction retournant l'historique d'écoute récent
+        enqueue: Fonction qui ajoute une piste (ID) à la queue Spotify
+        min_queue: Nombre de pistes en dessous duquel la queue est complétée
+        history_size: Nombre de pistes jouées servant de référence
+        cooldown: Délai (en secondes) avant qu'une piste jouée ou ajoutée
+                  puisse être proposée à nouveau
+    """
+
+    RECENT_REFRESH_INTERVAL = 300.0  # Secondes entre deux lectures de l'historique
+    PENDING_TIMEOUT = 30.0  # Secondes avant d'oublier un ajout jamais vu dans la queue
+
+    def __init__(self, store: FeatureStore, recent_fetcher: Callable[[], List[Dict]],
+                 enqueue: Callable[[str], object], min_queue: int = 3,
+                 history_size: int = 20, cooldown: float = 3 * 3600.0):
+        self.store = store
+        self.recent_fetcher = recent_fetcher
+        self.enqueue = enqueue
+        self.min_queue = min_queue
+        self.cooldown = cooldown
+        self.history = deque(maxlen=history_size)
+        self.candidates: Dict[str, Dict] = {}
+
+        # Matrice des candidats, agrandie par doublement
+        self._index: Dict[str, int] = {}
+        self._ids: List[str] = []
+        self._matrix = np.zeros((0, len(FEATURE_KEYS)), dtype=np.float32)
+        self._has_features = np.zeros(0, dtype=bool)
+        self._last_used = np.zeros(0, dtype=np.float64)
+        self._size = 0
+        # Matrice standardisée, recalculée seulement quand les candidats changent
+        self._standardized: Optional[np.ndarray] = None
+        self._norms: Optional[np.ndarray] = None
+
+        # Ajouts automatiques pas encore vus dans la queue lue par l'API
+        self._pending: Dict[str, float] = {}
+        self._recent_fetched_at: Optional[float] = None
+        self._running = False
+        self._lock = threading.Lock()
+
+    def add_candidates(self, tracks: Iterable[Dict]):
+        """Ajoute des pistes (dicts Spotify) à l'ensemble des candidats"""
+        with self._lock:
+            for track in tracks:
+                track_id = track.get('id')
+                if not track_id:
+                    continue
+                self.candidates[track_id] = {
+                    'id': track_id,
+                    'title': track.get('name') or track.get('title', ''),
+                    'artist': track.get('artist', ''),
+                    'album': track.get('album', ''),
+                    'duration_ms': track.get('duration_ms', 0),
+                }
+                if track_id not in self._index:
+                    self._append_row(track_id)
+
+    def record_played(self, track: Dict):
+        """Enregistre la piste en cours comme référence de similarité"""
+        track_id = track.get('id')
+        if not track_id:
+            return
+        with self._lock:
+            if self.history and self.history[-1] == track_id:
+                return
+            self.history.append(track_id)
+        self.add_candidates([track])
+        self._mark_used([track_id])
+
+    def rank(self, limit: int, exclude: Iterable[str] = ()) -> List[Dict]:
+        """
+        Retourne les meilleurs candidats, du plus au moins similaire
+
+        Args:
+            limit: Nombre de pistes voulues
+            exclude: IDs à ne pas proposer (déjà en queue ou en cours)
+        """
+        with self._lock:
+            size = self._size
+            if not size or limit <= 0:
+                return []
+            matrix = self._matrix[:size]
+            has_features = self._has_features[:size]
+
+            scores = np.full(size, -2.0, dtype=np.float32)
+            if has_features.any():
+                if self._standardized is None:
+                    # Standardiser pour que la similarité cosinus discrimine vraiment
+                    featured = matrix[has_features]
+                    mean = featured.mean(axis=0)
+                    std = featured.std(axis=0) + 1e-6
+                    self._standardized = (matrix - mean) / std
+                    self._norms = np.linalg.norm(self._standardized, axis=1) + 1e-6
+                standardized, norms = self._standardized, self._norms
+
+                seed_rows = [self._index[track_id] for track_id in self.history
+                             if self._has_features[self._index[track_id]]]
+                if seed_rows:
+                    seed = standardized[seed_rows].mean(axis=0)
+                    seed /= np.linalg.norm(seed) + 1e-6
+                    scores = np.where(has_features, standardized @ seed / norms, -2.0)
+                else:
+                    scores = np.where(has_features, 0.0, -2.0).astype(np.float32)
+
+            # Les pistes jouées ou ajoutées récemment sont écartées
+            blocked = self._last_used[:size] > time.time() - self.cooldown
+            for track_id in exclude:
+                row = self._index.get(track_id)
+                if row is not None:
+                    blocked[row] = True
+            scores[blocked] = -np.inf
+
+            available = int(np.count_nonzero(~blocked))
+            count = min(limit, available)
+            if not count:
+                return []
+            top = np.argpartition(-scores, count - 1)[:count]
+            top = top[np.argsort(-scores[top])]
+            return [self.candidates[self._ids[row]] for row in top]
+
+    def top_up(self, queue_ids: List[str], current_id: Optional[str] = None) -> List[Dict]:
+        """
+        Complète la queue jusqu'à min_queue pistes (appel bloquant)
+
+        Returns:
+            Les pistes ajoutées
+        """
+        missing = self.min_queue - len(queue_ids) - self._unconfirmed(queue_ids, current_id)
+        if missing <= 0:
+            return []
+
+        now = time.monotonic()
+        if self._recent_fetched_at is None or now - self._recent_fetched_at >= self.RECENT_REFRESH_INTERVAL:
+            self._recent_fetched_at = now
+            self.add_candidates(self.recent_fetcher())
+
+        with self._lock:
+            unfeatured = [self._ids[row] for row in np.flatnonzero(~self._has_features[:self._size])]
+        if unfeatured and self.store.ensure(unfeatured):
+            self._refresh_features(unfeatured)
+
+        exclude = list(queue_ids) + ([current_id] if current_id else [])
+        with self._lock:
+            exclude += list(self._pending)
+        picks = self.rank(missing, exclude=exclude)
+        for track in picks:
+            with self._lock:
+                self._pending[track['id']] = time.monotonic()
+            self.enqueue(track['id'])
+        self._mark_used([track['id'] for track in picks])
+        return picks
+
+    def request_top_up(self, queue_ids: List[str], current_id: Optional[str] = None):
+        """
+        Lance top_up dans un thread, sauf si un remplissage est déjà en cours
+
+        Les ajouts précédents comptent tant qu'ils n'apparaissent pas dans
+        queue_ids : une queue lue avant leur exécution ne déclenche pas de
+        nouveau remplissage.
+        """
+        if len(queue_ids) + self._unconfirmed(queue_ids, current_id) >= self.min_queue:
+            return
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+
+        def run():
+            try:
+                picks = self.top_up(queue_ids, current_id)
+                if picks:
+                    print(f"Remplissage automatique: {len(picks)} piste(s) ajoutée(s)")
+            except Exception as e:
+                print(f"Erreur lors du remplissage automatique: {e}")
+            finally:
+                with self._lock:
+                    self._running = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _unconfirmed(self, queue_ids: List[str], current_id: Optional[str]) -> int:
+        """Oublie les ajouts vus dans la queue (ou expirés) et compte les autres"""
+        seen = set(queue_ids)
+        if current_id:
+            seen.add(current_id)
+        expired = time.monotonic() - self.PENDING_TIMEOUT
+        with self._lock:
+            self._pending = {track_id: added_at for track_id, added_at in self._pending.items()
+                             if track_id not in seen and added_at > expired}
+            return len(self._pending)
+
+    def _append_row(self, track_id: str):
+        if self._size == len(self._matrix):
+            capacity = max(64, 2 * len(self._matrix))
+            self._matrix = _grow(self._matrix, capacity)
+            self._has_features = _grow(self._has_features, capacity)
+            self._last_used = _grow(self._last_used, capacity)
+        row = self._size
+        self._standardized = None
+        self._index[track_id] = row
+        self._ids.append(track_id)
+        vector = self.store.get(track_id)
+        if vector is not None:
+            self._matrix[row] = vector
+            self._has_features[row] = True
+        self._size += 1
+
+    def _refresh_features(self, track_ids: Iterable[str]):
+        with self._lock:
+            for track_id in track_ids:
+                vector = self.store.get(track_id)
+                if vector is not None:
+                    row = self._index[track_id]
+                    self._matrix[row] = vector
+                    self._has_features[row] = True
+            self._standardized = None
+
+    def _mark_used(self, track_ids: Iterable[str]):
+        now = time.time()
+        with self._lock:
+            for track_id in track_ids:
+                row = self._index.get(track_id)
+                if row is not None:
+                    self._last_used[row] = now
+
+
+def _grow(array: np.ndarray, capacity: int) -> np.ndarray:
+    grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
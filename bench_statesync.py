@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark du protocole de synchronisation : coût d'encodage et
+d'application des snapshots et deltas selon la taille de la queue,
+comparé à l'envoi d'un snapshot JSON complet.
+
+    python bench_statesync.py --sizes 100 1000 10000 50000
+"""
+
+import argparse
+import json
+import time
+
+from statesync import PlaybackState, StateDecoder, StateEncoder
+
+
+def make_track(number: int) -> dict:
+    return {
+        'id': f"{number:022d}",
+        'title': f"Titre {number}",
+        'artist': f"Artiste {number % 300}",
+        'album': f"Album {number % 1000}",
+        'duration_ms': 180_000 + number % 60_000,
+    }
+
+
+def timed(function, repeat: int):
+    """Temps moyen d'un appel en microsecondes, et le dernier résultat"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat * 1e6, result
+
+
+def bench(size: int, repeat: int):
+    queue = [make_track(number) for number in range(size)]
+    state = PlaybackState(make_track(-1), True, 0, queue)
+    encoder = StateEncoder()
+    encoder.update(state)
+
+    snapshot_us, snapshot = timed(encoder.snapshot, repeat)
+    apply_us, _ = timed(lambda: StateDecoder().apply(snapshot), repeat)
+    json_us, json_payload = timed(lambda: json.dumps({
+        'current': state.current, 'is_playing': True, 'progress_ms': 0, 'queue': queue,
+    }).encode("utf-8"), repeat)
+    json_apply_us, _ = timed(lambda: json.loads(json_payload), repeat)
+    print(f"queue={size:>6}  snapshot: {len(snapshot):>9} o  encode {snapshot_us:9.0f} µs  "
+          f"apply {apply_us:9.0f} µs")
+    print(f"{'':13}JSON:     {len(json_payload):>9} o  encode {json_us:9.0f} µs  "
+          f"apply {json_apply_us:9.0f} µs")
+
+    # Scénarios de delta, chacun appliqué sur un client synchronisé
+    counter = [size]
+
+    def next_track(current: PlaybackState) -> PlaybackState:
+        return PlaybackState(current.queue[0], True, 0, current.queue[1:])
+
+    def add_track(current: PlaybackState) -> PlaybackState:
+        counter[0] += 1
+        return PlaybackState(current.current, True, current.progress_ms,
+                             current.queue + [make_track(counter[0])])
+
+    def progress_tick(current: PlaybackState) -> PlaybackState:
+        return PlaybackState(current.current, True, current.progress_ms + 1000, current.queue)
+
+    def move_track(current: PlaybackState) -> PlaybackState:
+        moved = list(current.queue)
+        moved.insert(0, moved.pop(len(moved) // 2))
+        return PlaybackState(current.current, True, current.progress_ms, moved)
+
+    for name, change in (("progression", progress_tick), ("ajout", add_track),
+                         ("suivante", next_track), ("déplacement", move_track)):
+        decoder = StateDecoder()
+        decoder.apply(encoder.snapshot())
+        encode_total = apply_total = 0.0
+        size_total = 0
+        for _ in range(repeat):
+            state = change(state)
+            start = time.perf_counter()
+            delta = encoder.update(state)
+            encode_total += time.perf_counter() - start
+            start = time.perf_counter()
+            decoder.apply(delta)
+            apply_total += time.perf_counter() - start
+            size_total += len(delta)
+        print(f"{'':13}delta {name:<12} {size_total // repeat:>6} o  "
+              f"encode {encode_total / repeat * 1e6:9.0f} µs  apply {apply_total / repeat * 1e6:9.0f} µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du protocole de synchronisation")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    for size in args.sizes:
+        bench(size, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Cache de snapshots (stale-while-revalidate) et disjoncteur pour l'API Spotify.
+
+Quand Spotify a des problèmes, on continue de servir le dernier état valide
+(marqué comme périmé) au lieu de vider l'interface, et on réduit le rythme
+des appels tant que l'API ne répond pas.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Optional
+
+
+class CircuitBreaker:
+    """Disjoncteur partagé par les appels à l'API Spotify"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 5.0,
+                 max_reset_timeout: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """
+        Indique si un appel à l'API peut être tenté
+
+        Quand le disjoncteur est ouvert, un seul appel de sonde est autorisé
+        une fois le délai écoulé.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        """Enregistre un appel réussi et referme le disjoncteur"""
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.reset_timeout = self.base_reset_timeout
+
+    def record_failure(self):
+        """Enregistre un échec et ouvre le disjoncteur si nécessaire"""
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                # La sonde a échoué : on espace davantage les prochaines sondes
+                self.reset_timeout = min(self.reset_timeout * 2, self.max_reset_timeout)
+                self._open()
+            elif self.failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self) -> bool:
+        return self.state != self.CLOSED
+
+
+class Snapshot:
+    """Dernier état connu d'un endpoint, avec son marqueur de fraîcheur"""
+
+    def __init__(self, value: Any, fetched_at: Optional[float], stale: bool):
+        self.value = value
+        self.fetched_at = fetched_at
+        self.stale = stale
+
+    @property
+    def age(self) -> Optional[float]:
+        """Âge du snapshot en secondes (None si jamais récupéré)"""
+        if self.fetched_at is None:
+            return None
+        return time.monotonic() - self.fetched_at
+
+
+class SnapshotCache:
+    """
+    Cache stale-while-revalidate devant un endpoint de lecture
+
+    Args:
+        fetcher: Fonction qui interroge l'API et lève une exception en cas d'échec
+        default: Valeur servie tant qu'aucun état valide n'a été récupéré
+        ttl: Durée (en secondes) pendant laquelle un snapshot est considéré frais
+        breaker: Disjoncteur à consulter avant chaque appel
+    """
+
+    def __init__(self, fetcher: Callable[[], Any], default: Any, ttl: float,
+                 breaker: CircuitBreaker):
+        self.fetcher = fetcher
+        self.default = default
+        self.ttl = ttl
+        self.breaker = breaker
+        self._value = default
+        self._fetched_at: Optional[float] = None
+        self._failed = False
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def get(self) -> Snapshot:
+        """
+        Retourne le snapshot courant
+
+        Le premier appel est synchrone ; ensuite, un snapshot expiré est servi
+        immédiatement pendant qu'une revalidation tourne en arrière-plan.
+        """
+        if self._fetched_at is None and not self._failed:
+            self.refresh()
+        elif self._is_expired():
+            self._revalidate_in_background()
+        return self.snapshot()
+
+    def snapshot(self) -> Snapshot:
+        """Retourne l'état en cache sans déclencher d'appel"""
+        with self._lock:
+            stale = self._failed or self.breaker.is_open
+            return Snapshot(self._value, self._fetched_at, stale)
+
+    def refresh(self) -> bool:
+        """
+        Interroge l'API de manière synchrone
+
+        Returns:
+            True si l'état a été mis à jour, False sinon
+        """
+        if not self.breaker.allow_request():
+            return False
+        try:
+            value = self.fetcher()
+        except Exception as e:
+            print(f"Erreur lors de la revalidation du cache: {e}")
+            self.breaker.record_failure()
+            with self._lock:
+                self._failed = True
+            return False
+
+        self.breaker.record_success()
+        with self._lock:
+            self._value = value
+            self._fetched_at = time.monotonic()
+            self._failed = False
+        return True
+
+    def invalidate(self):
+        """Force la revalidation au prochain accès"""
+        with self._lock:
+            if self._fetched_at is not None:
+                self._fetched_at = time.monotonic() - self.ttl
+
+    def _is_expired(self) -> bool:
+        with self._lock:
+            if self._fetched_at is None:
+                return True
+            return time.monotonic() - self._fetched_at >= self.ttl
+
+    def _revalidate_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
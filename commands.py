@@ -0,0 +1,166 @@
+"""
+File de commandes d'écriture pour les contrôles de lecture.
+
+Un seul thread exécute les commandes envoyées à l'API Spotify. Quand la file
+est au repos, une commande part immédiatement ; celles qui arrivent pendant
+son exécution ou dans une courte fenêtre après sont regroupées : les sauts
+consécutifs (suivante/précédente) sont additionnés, les lecture/pause
+consécutifs se réduisent au dernier état demandé et les ajouts identiques
+sont dédupliqués. L'ordre entre commandes de types différents est conservé.
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+
+
+class Command:
+    """Commande d'écriture en attente d'exécution"""
+
+    def __init__(self, kind: str, arg: Any = None):
+        self.kind = kind
+        self.arg = arg
+        self.submitted_at = time.monotonic()
+        self.future: Future = Future()
+
+
+class CommandQueue:
+    """
+    File de commandes avec regroupement
+
+    Args:
+        handlers: Fonctions d'exécution par type de commande :
+                  'add' (track_id), 'skip' (nombre de pistes, négatif pour reculer)
+                  et 'play' (True pour lire, False pour mettre en pause).
+                  Chacune retourne True si la commande a réussi.
+        window: Durée (en secondes) pendant laquelle les commandes qui suivent
+                une exécution sont regroupées
+    """
+
+    def __init__(self, handlers: Dict[str, Callable[[Any], bool]], window: float = 0.1):
+        self.handlers = handlers
+        self.window = window
+        self.submitted = 0
+        self.executed = 0
+        self._queue: "queue.Queue[Command]" = queue.Queue()
+        self._latencies: Dict[str, deque] = {}
+        self._worker = None
+        self._last_executed = float('-inf')
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, arg: Any = None) -> Future:
+        """
+        Ajoute une commande à la file
+
+        Returns:
+            Future résolu avec le résultat (bool) de l'exécution regroupée
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Type de commande inconnu: {kind}")
+        command = Command(kind, arg)
+        self._ensure_worker()
+        self._queue.put(command)
+        return command.future
+
+    def latency_stats(self) -> Dict[str, Dict[str, float]]:
+        """Latence (soumission → résultat) par type de commande, en millisecondes"""
+        stats = {}
+        with self._lock:
+            latencies = {kind: sorted(values) for kind, values in self._latencies.items()}
+        for kind, values in latencies.items():
+            if not values:
+                continue
+            stats[kind] = {
+                'count': len(values),
+                'mean_ms': sum(values) / len(values) * 1000,
+                'p95_ms': values[min(len(values) - 1, int(len(values) * 0.95))] * 1000,
+                'max_ms': values[-1] * 1000,
+            }
+        return stats
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            if time.monotonic() - self._last_executed < self.window:
+                # Rafale en cours : on attend la fin de la fenêtre pour regrouper
+                deadline = self._last_executed + self.window
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+            else:
+                # File au repos : la commande part sans attendre, avec celles déjà reçues
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+            for group in coalesce(batch):
+                self._execute(group)
+            self._last_executed = time.monotonic()
+
+    def _execute(self, group: List[Command]):
+        kind = group[0].kind
+        self.submitted += len(group)
+        try:
+            if kind == 'skip':
+                count = sum(command.arg for command in group)
+                result = self.handlers[kind](count) if count else True
+                self.executed += 1 if count else 0
+            elif kind == 'play':
+                result = self.handlers[kind](group[-1].arg)
+                self.executed += 1
+            else:
+                result = self.handlers[kind](group[0].arg)
+                self.executed += 1
+        except Exception as e:
+            print(f"Erreur lors de l'exécution de la commande {kind}: {e}")
+            result = False
+
+        now = time.monotonic()
+        with self._lock:
+            latencies = self._latencies.setdefault(kind, deque(maxlen=500))
+            for command in group:
+                latencies.append(now - command.submitted_at)
+        for command in group:
+            command.future.set_result(result)
+
+
+def coalesce(batch: List[Command]) -> List[List[Command]]:
+    """
+    Regroupe les commandes d'un lot
+
+    Les ajouts d'une même piste sont fusionnés avec le premier ajout ; les
+    sauts et lecture/pause consécutifs sont fusionnés entre eux.
+
+    Returns:
+        Liste de groupes, dans l'ordre d'exécution
+    """
+    groups: List[List[Command]] = []
+    adds: Dict[Any, List[Command]] = {}
+    for command in batch:
+        if command.kind == 'add':
+            if command.arg in adds:
+                adds[command.arg].append(command)
+                continue
+            group = [command]
+            adds[command.arg] = group
+            groups.append(group)
+        elif groups and groups[-1][0].kind == command.kind and command.kind in ('skip', 'play'):
+            groups[-1].append(command)
+        else:
+            groups.append([command])
+    return groups
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Mode démon sans interface : pilote SpotifyManager via une API JSON locale,
+pour les scripts ou un Stream Deck.
+
+Chaque requête est une ligne JSON, par exemple
+    {"id": 1, "method": "enqueue", "params": {"track_id": "..."}}
+et chaque réponse une ligne JSON {"id": 1, "result": ...} ou
+{"id": 1, "error": "..."}. Un tableau de requêtes est traité comme un lot :
+les lectures identiques ne sont faites qu'une fois et les commandes sont
+envoyées dans l'ordre à la file d'écriture, qui peut les regrouper.
+
+La requête {"method": "subscribe"} abonne la connexion à l'état de lecture :
+la réponse contient un snapshot du protocole statesync (en base64), puis
+chaque changement relevé par le poller est poussé sous la forme
+{"event": "state", "payload": ...}. Un client qui manque un message se
+réabonne pour recevoir un nouveau snapshot.
+
+    python daemon.py                      # 127.0.0.1:8765
+    python daemon.py --socket /tmp/beattogether.sock
+    python daemon.py --follow             # client : affiche l'état synchronisé
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+from typing import Any, Dict, List, Optional, Set
+
+from manager import SpotifyManager, Track
+from spotify import SpotifyClient, SpotifyConfigError
+
+# Méthodes en lecture seule : partagées entre les requêtes d'un même lot
+READ_METHODS = ('current_track', 'queue', 'search', 'metrics')
+WRITE_METHODS = ('enqueue', 'play_pause', 'play', 'pause', 'next', 'previous')
+
+# Données en attente d'envoi au-delà desquelles un abonné trop lent est déconnecté
+SUBSCRIBER_BUFFER_LIMIT = 16 * 1024 * 1024
+# Taille maximale d'une ligne reçue par le client (un snapshot peut être gros)
+FOLLOW_LINE_LIMIT = 64 * 1024 * 1024
+
+
+class RequestError(Exception):
+    """Requête invalide, renvoyée au client comme erreur"""
+
+
+class Daemon:
+    """Serveur JSON local autour d'un SpotifyManager"""
+
+    def __init__(self, manager: SpotifyManager, poll_interval: float = 3.0):
+        self.manager = manager
+        self.poll_interval = poll_interval
+        self.subscribers: Set[asyncio.StreamWriter] = set()
+        self.poll_task: Optional[asyncio.Task] = None
+
+    async def handle_batch(self, requests: List[Dict]) -> List[Dict]:
+        """Traite un lot de requêtes et retourne les réponses dans le même ordre"""
+        reads: Dict[str, asyncio.Future] = {}
+        pending = []
+        for request in requests:
+            try:
+                pending.append(self._dispatch(request, reads))
+            except Exception as e:
+                # Une requête invalide n'échoue que pour elle-même, pas pour le lot
+                pending.append(_failed(e))
+
+        responses = []
+        for request, awaitable in zip(requests, pending):
+            response = {'id': request.get('id') if isinstance(request, dict) else None}
+            try:
+                response['result'] = await awaitable
+            except Exception as e:
+                response['error'] = str(e)
+            responses.append(response)
+        return responses
+
+    def _dispatch(self, request: Any, reads: Dict[str, asyncio.Future]):
+        """
+        Lance une requête et retourne l'attente de son résultat
+
+        Les commandes sont soumises immédiatement, dans l'ordre du lot ;
+        les lectures identiques d'un même lot partagent le même appel.
+        """
+        if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+            raise RequestError("Requête invalide : objet avec un champ 'method' attendu")
+        method = request['method']
+        params = request.get('params')
+        if params is None:
+            params = {}
+        elif not isinstance(params, dict):
+            raise RequestError("Paramètre 'params' invalide : objet attendu")
+
+        if method in READ_METHODS:
+            key = json.dumps([method, params], sort_keys=True)
+            if key not in reads:
+                reads[key] = asyncio.ensure_future(asyncio.to_thread(self._read, method, params))
+            return reads[key]
+
+        if method in WRITE_METHODS:
+            return asyncio.wrap_future(self._submit(method, params))
+
+        raise RequestError(f"Méthode inconnue: {method}")
+
+    def _read(self, method: str, params: Dict) -> Any:
+        if method == 'current_track':
+            track = self.manager.get_current_track()
+            return track.to_dict() if track else None
+        if method == 'queue':
+            return [track.to_dict() for track in self.manager.get_queue()]
+        if method == 'search':
+            query = str(params.get('query', '')).strip()
+            if not query:
+                raise RequestError("Paramètre 'query' manquant")
+            return [track.to_dict() for track in self.manager.search_tracks(query)]
+        return {
+            'commands': self.manager.command_latencies(),
+            'queue_stale': self.manager.queue_stale,
+        }
+
+    def _submit(self, method: str, params: Dict):
+        if method == 'enqueue':
+            track_id = params.get('track_id')
+            if not track_id or not isinstance(track_id, str):
+                raise RequestError("Paramètre 'track_id' manquant")
+            return self.manager.submit_add(Track(track_id=track_id))
+        if method == 'play_pause':
+            play = params.get('play')
+            if play is not None and not isinstance(play, bool):
+                raise RequestError("Paramètre 'play' invalide : booléen attendu")
+            return self.manager.submit_play(play)
+        if method in ('play', 'pause'):
+            return self.manager.submit_play(method == 'play')
+        return self.manager.submit_skip(1 if method == 'next' else -1)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Une connexion peut envoyer plusieurs lignes successives"""
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                try:
+                    payload = json.loads(line)
+                except ValueError as e:
+                    reply = {'id': None, 'error': f"JSON invalide: {e}"}
+                else:
+                    if isinstance(payload, dict) and payload.get('method') == 'subscribe':
+                        reply = self.subscribe(payload, writer)
+                    elif isinstance(payload, list):
+                        reply = await self.handle_batch(payload)
+                    else:
+                        reply = (await self.handle_batch([payload]))[0]
+                writer.write(json.dumps(reply, ensure_ascii=False).encode("utf-8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.subscribers.discard(writer)
+            writer.close()
+
+    def subscribe(self, request: Dict, writer: asyncio.StreamWriter) -> Dict:
+        """
+        Abonne la connexion à l'état de lecture
+
+        Snapshot et abonnement dans le même tour de boucle : aucun delta ne
+        peut s'intercaler.
+        """
+        reply = {'id': request.get('id'), 'result': _encode_payload(self.manager.state_snapshot())}
+        self.subscribers.add(writer)
+        return reply
+
+    async def poll(self):
+        """
+        Lecture périodique de l'état : la piste en cours alimente l'historique
+        du remplissage automatique, la queue le déclenche, et les abonnés
+        reçoivent les changements
+        """
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                current, queue = await asyncio.to_thread(self._read_state)
+                # L'encodeur n'est utilisé que depuis la boucle, comme les snapshots
+                self.broadcast(self.manager.encode_state(current, queue))
+            except Exception as e:
+                # Une lecture ratée ne doit pas arrêter le poller pour toute la session
+                print(f"Erreur lors de la lecture périodique de l'état: {e!r}")
+
+    def _read_state(self):
+        # Piste en cours d'abord : get_queue l'exclut du remplissage
+        current = self.manager.get_current_track()
+        return current, self.manager.get_queue()
+
+    def broadcast(self, message: Optional[bytes]):
+        """Pousse un message de synchronisation à tous les abonnés"""
+        if message is None or not self.subscribers:
+            return
+        line = json.dumps({'event': 'state', 'payload': _encode_payload(message)}).encode("utf-8") + b"\n"
+        for writer in list(self.subscribers):
+            if writer.transport.get_write_buffer_size() > SUBSCRIBER_BUFFER_LIMIT:
+                # Le client ne lit plus : il se réabonnera pour un nouveau snapshot
+                self.subscribers.discard(writer)
+                writer.close()
+                continue
+            writer.write(line)
+
+    async def serve(self, host: str, port: int, socket_path: str = None):
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            server = await asyncio.start_unix_server(self.handle_connection, path=socket_path)
+            print(f"Démon BeatTogether en écoute sur {socket_path}")
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+            print(f"Démon BeatTogether en écoute sur {host}:{port}")
+
+        if self.poll_interval > 0:
+            self.poll_task = asyncio.ensure_future(self.poll())
+        async with server:
+            await server.serve_forever()
+
+
+async def _failed(error: Exception):
+    raise error
+
+
+def _encode_payload(message: bytes) -> str:
+    return base64.b64encode(message).decode("ascii")
+
+
+async def follow(host: str, port: int, socket_path: str = None):
+    """Client : s'abonne à l'état de lecture et l'affiche à chaque changement"""
+    # Le client ne fait que décoder l'état : aucun compte Spotify n'est utilisé
+    manager = SpotifyManager(SpotifyClient(None))
+    if socket_path:
+        reader, writer = await asyncio.open_unix_connection(socket_path, limit=FOLLOW_LINE_LIMIT)
+    else:
+        reader, writer = await asyncio.open_connection(host, port, limit=FOLLOW_LINE_LIMIT)
+
+    async def subscribe():
+        writer.write(b'{"method": "subscribe"}\n')
+        await writer.drain()
+
+    await subscribe()
+    while line := await reader.readline():
+        message = json.loads(line)
+        payload = message.get('payload') if message.get('event') == 'state' else message.get('result')
+        if payload is None:
+            print(f"Erreur: {message.get('error')}")
+            continue
+        if not manager.apply_state(base64.b64decode(payload)):
+            await subscribe()
+            continue
+
+        track = manager.synced_current_track()
+        queue = manager.synced_queue()
+        status = "▶" if track and track.is_playing else "⏸"
+        print(f"{status} {track or 'Aucune musique en cours'}  ({len(queue)} piste(s) en attente)")
+        for queued in queue[:3]:
+            print(f"    {queued}")
+    writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API JSON locale pour piloter Spotify sans interface")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", help="Chemin d'un socket Unix (remplace --host/--port)")
+    parser.add_argument("--poll-interval", type=float, default=3.0,
+                        help="Secondes entre deux lectures de l'état (0 pour désactiver)")
+    parser.add_argument("--follow", action="store_true",
+                        help="Se connecte à un démon et affiche l'état synchronisé")
+    args = parser.parse_args()
+
+    try:
+        if args.follow:
+            asyncio.run(follow(args.host, args.port, args.socket))
+        else:
+            daemon = Daemon(SpotifyManager(), poll_interval=args.poll_interval)
+            asyncio.run(daemon.serve(args.host, args.port, args.socket))
+    except SpotifyConfigError as e:
+        raise SystemExit(str(e))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,8 @@ la liste d'attente et permettre d'ajouter des sons.
 """
 
 import asyncio
-from datetime import datetime
+import copy
+from collections import deque
 from typing import List, Optional, Dict
 from textual.app import App, ComposeResult
 from textual.containers import Container, Horizontal, Vertical
@@ -17,129 +18,9 @@ from textual.binding import Binding
 from textual.reactive import reactive
 from textual.message import Message
 
-# Import des fonctions Spotify
-from spotify import (
-    getCurrentPlayingTrack, getQueue, SearchSong, AddtoQueue, 
-    DeletefromQueue, playTrack, pausePlayback, resumePlayback, 
-    nextTrack, previousTrack
-)
-
-
-class Track:
-    """Représente une piste musicale"""
-    def __init__(self, track_data: Dict = None, title: str = None, artist: str = None, album: str = None, track_id: str = None):
-        if track_data:
-            # Création à partir des données Spotify
-            self.id = track_data.get('id', '')
-            self.title = track_data.get('name', '') or track_data.get('title', '')
-            self.artist = track_data.get('artist', '')
-            self.album = track_data.get('album', '')
-            self.is_playing = track_data.get('is_playing', False)
-            self.progress_ms = track_data.get('progress_ms', 0)
-            self.duration_ms = track_data.get('duration_ms', 0)
-        else:
-            # Création manuelle (pour compatibilité)
-            self.id = track_id or ''
-            self.title = title or ''
-            self.artist = artist or ''
-            self.album = album or ''
-            self.is_playing = False
-            self.progress_ms = 0
-            self.duration_ms = 0
-        
-        self.added_at = datetime.now()
-
-    def __str__(self):
-        return f"{self.title} - {self.artist}"
-
-
-class SpotifyManager:
-    """Gestionnaire pour l'API Spotify"""
-    
-    def __init__(self):
-        self.local_queue = []  # Queue locale pour compenser les limitations de l'API
-        self.is_playing = False
-
-    def get_current_track(self) -> Optional[Track]:
-        """Récupère la piste actuellement en cours"""
-        track_data = getCurrentPlayingTrack()
-        if track_data:
-            print(f"Debug - Données reçues: {track_data}")  # Debug
-            track = Track(track_data=track_data)
-            print(f"Debug - Track créé: title='{track.title}', artist='{track.artist}'")  # Debug
-            return track
-        return None
-
-    def get_queue(self) -> List[Track]:
-        """Récupère la liste d'attente (queue locale + API)"""
-        # Récupérer la queue depuis l'API Spotify
-        api_queue = getQueue()
-        tracks = []
-        
-        # Convertir les dictionnaires en objets Track
-        for track_data in api_queue:
-            tracks.append(Track(track_data=track_data))
-        
-        # Si pas de queue API, utiliser la queue locale
-        if not tracks:
-            tracks = self.local_queue
-            
-        return tracks
-
-    def add_to_queue(self, track: Track):
-        """Ajoute une piste à la queue"""
-        if track.id:
-            # Ajouter via l'API Spotify
-            success = AddtoQueue(track.id)
-            if success:
-                self.local_queue.append(track)
-                return True
-        else:
-            # Ajouter à la queue locale seulement
-            self.local_queue.append(track)
-            return True
-        return False
-
-    def search_tracks(self, query: str) -> List[Track]:
-        """Recherche des pistes sur Spotify"""
-        results = SearchSong(query, limit=10)
-        tracks = []
-        for track_data in results:
-            tracks.append(Track(track_data=track_data))
-        return tracks
-
-    def play_pause(self):
-        """Toggle play/pause"""
-        current_track = self.get_current_track()
-        if current_track and current_track.is_playing:
-            self.is_playing = pausePlayback()
-        else:
-            self.is_playing = resumePlayback()
-
-    def next_track(self):
-        """Passe à la piste suivante"""
-        success = nextTrack()
-        if success and self.local_queue:
-            # Retirer la première piste de notre queue locale
-            self.local_queue.pop(0)
-        return success
-
-    def previous_track(self):
-        """Revient à la piste précédente"""
-        return previousTrack()
-
-    def play_track(self, track: Track):
-        """Joue une piste spécifique"""
-        if track.id:
-            return playTrack(track.id)
-        return False
-
-    def remove_from_queue(self, track: Track):
-        """Supprime une piste de la queue locale"""
-        if track in self.local_queue:
-            self.local_queue.remove(track)
-            return True
-        return False
+from manager import Track, SpotifyManager
+from spotify import SpotifyConfigError
+from memprofile import MemoryProfiler
 
 
 class TrackItem(ListItem):
@@ -152,12 +33,22 @@ class TrackItem(ListItem):
     def compose(self):
         yield Horizontal(
             Vertical(
-                Label(f"[bold]{self.track.title}[/bold]"),
-                Label(f"{self.track.artist}"),
+                Label(f"[bold]{self.track.title}[/bold]", classes="track-title"),
+                Label(f"{self.track.artist}", classes="track-artist"),
             ),
             id="track-container"
         )
 
+    def show_track(self, track: Track):
+        """Affiche une autre piste dans le même élément"""
+        self.track = track
+        try:
+            self.query_one(".track-title", Label).update(f"[bold]{track.title}[/bold]")
+            self.query_one(".track-artist", Label).update(f"{track.artist}")
+        except Exception:
+            # Pas encore composé : compose() utilisera self.track
+            pass
+
 
 class CurrentTrackWidget(Static):
     """Widget pour afficher la piste en cours"""
@@ -199,9 +90,10 @@ class CurrentTrackWidget(Static):
         try:
             if track:
                 self.query_one("#current-track-info").update(f"🎵 {track.title}")
-                self.query_one("#current-track-details").update(
-                    f"👤 {track.artist}"
-                )
+                details = f"👤 {track.artist}"
+                if track.stale:
+                    details += "  ⚠️ Spotify injoignable, dernier état connu"
+                self.query_one("#current-track-details").update(details)
                 # Afficher la durée en temps réel
                 duration_text = self.get_duration_display(track)
                 self.query_one("#current-track-duration").update(duration_text)
@@ -258,19 +150,46 @@ class QueueWidget(Static):
     """Widget pour afficher la liste d'attente"""
     
     tracks = reactive([])
+    stale = reactive(False)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
     def compose(self):
-        yield Label("📋 Liste d'attente", classes="title")
+        yield Label("📋 Liste d'attente", classes="title", id="queue-title")
         yield ListView(id="queue-list")
 
-    def watch_tracks(self, tracks: List[Track]):
+    def watch_stale(self, stale: bool):
+        """Signale que la liste affichée est le dernier état connu"""
+        title = "📋 Liste d'attente"
+        if stale:
+            title += " (⚠️ dernier état connu)"
+        try:
+            self.query_one("#queue-title", Label).update(title)
+        except Exception:
+            # Les widgets ne sont pas encore montés, on ignore l'erreur
+            pass
+
+    def watch_tracks(self, old_tracks: List[Track], tracks: List[Track]):
         queue_list = self.query_one("#queue-list", ListView)
-        queue_list.clear()
-        for track in tracks:
+
+        # Les éléments sont réutilisés d'une piste à l'autre et masqués quand
+        # la queue raccourcit : un widget retiré reste retenu par les caches de
+        # rendu de Textual, en recréer à chaque piste jouée fait grossir la mémoire
+        items = list(queue_list.children)
+        for item, track in zip(items, tracks):
+            if (item.track.id, item.track.title, item.track.artist) != (track.id, track.title, track.artist):
+                item.show_track(track)
+            item.display = True
+            item.disabled = False
+        for item in items[len(tracks):]:
+            # Désactivé aussi : le curseur de ListView ne saute que les éléments désactivés
+            item.display = False
+            item.disabled = True
+        for track in tracks[len(items):]:
             queue_list.append(TrackItem(track))
+        if queue_list.index is not None and queue_list.index >= len(tracks):
+            queue_list.index = len(tracks) - 1 if tracks else None
 
 
 class SearchWidget(Static):
@@ -394,12 +313,23 @@ class SpotifyApp(App):
 
     BINDINGS = [
         Binding("q", "quit", "Quitter"),
+        Binding("p", "play_pause", "Lecture/Pause"),
+        Binding("n", "next_track", "Suivante"),
+        Binding("b", "previous_track", "Précédente"),
+        Binding("m", "toggle_memory_profiler", "Mémoire"),
     ]
 
+    MEMORY_REPORT_PATH = "memory_report.txt"
+
     def __init__(self):
         super().__init__()
         self.spotify = SpotifyManager()
         self.search_results = []
+        # Pistes passées, pour afficher immédiatement la piste précédente
+        self.history = deque(maxlen=50)
+        # Commandes optimistes en attente de confirmation par l'API
+        self.pending_commands = 0
+        self.memory_profiler = MemoryProfiler()
 
     def compose(self) -> ComposeResult:
         yield Header()
@@ -437,13 +367,23 @@ class SpotifyApp(App):
 
     def update_current_track(self):
         """Met à jour l'affichage de la piste en cours"""
+        if self.pending_commands:
+            # Ne pas écraser l'état optimiste avant la confirmation de l'API
+            return
         current_widget = self.query_one("#current-track", CurrentTrackWidget)
-        current_widget.track = self.spotify.get_current_track()
+        new_track = self.spotify.get_current_track()
+        old_track = current_widget.track
+        if old_track and (new_track is None or new_track.id != old_track.id):
+            self.history.append(old_track)
+        current_widget.track = new_track
 
     def update_queue(self):
         """Met à jour la liste d'attente"""
+        if self.pending_commands:
+            return
         queue_widget = self.query_one("#queue", QueueWidget)
         new_tracks = self.spotify.get_queue()
+        queue_widget.stale = self.spotify.queue_stale
         
         # Comparer les listes pour éviter les mises à jour inutiles
         if not self._queues_are_equal(queue_widget.tracks, new_tracks):
@@ -507,31 +447,152 @@ class SpotifyApp(App):
             # Ajouter la piste sélectionnée à la queue
             selected_item = event.item
             if hasattr(selected_item, 'track'):
-                success = self.spotify.add_to_queue(selected_item.track)
-                if success:
-                    self.update_queue()
-                    
-                    # Nettoyer les résultats de recherche
-                    search_input = self.query_one("#search-input", Input)
-                    search_input.value = ""
-                    self.query_one("#search-results", ListView).clear()
-                    
-                    self.notify(f"✅ '{selected_item.track.title}' ajoutée à la liste d'attente!")
-                else:
-                    self.notify(f"❌ Erreur lors de l'ajout de '{selected_item.track.title}'")
+                self.add_track_optimistic(selected_item.track)
+
+                # Nettoyer les résultats de recherche
+                search_input = self.query_one("#search-input", Input)
+                search_input.value = ""
+                self.query_one("#search-results", ListView).clear()
         
         elif event.list_view.id == "search-results-screen":
             # Ajouter la piste sélectionnée à la queue depuis l'écran de recherche
             selected_item = event.item
             if hasattr(selected_item, 'track'):
-                success = self.spotify.add_to_queue(selected_item.track)
-                if success:
-                    self.update_queue()
-                    self.notify(f"✅ '{selected_item.track.title}' ajoutée à la liste d'attente!")
-                    # Retourner à l'écran d'accueil après ajout
-                    self.show_main_screen()
-                else:
-                    self.notify(f"❌ Erreur lors de l'ajout de '{selected_item.track.title}'")
+                self.add_track_optimistic(selected_item.track)
+                # Retourner à l'écran d'accueil après ajout
+                self.show_main_screen()
+
+    def run_optimistic(self, apply, command, rollback, failure_message: str):
+        """
+        Applique un changement local immédiatement, puis le confirme auprès de l'API
+
+        Args:
+            apply: Modifie l'affichage local (appelé tout de suite)
+            command: Appel bloquant à l'API, exécuté dans un thread, retourne un bool
+            rollback: Annule le changement local si l'API refuse la commande
+            failure_message: Notification affichée en cas d'échec
+        """
+        apply()
+        self.pending_commands += 1
+        self.run_worker(self._confirm_command(command, rollback, failure_message))
+
+    async def _confirm_command(self, command, rollback, failure_message: str):
+        """Confirme une commande optimiste et annule le changement en cas d'échec"""
+        try:
+            success = await asyncio.to_thread(command)
+            if success:
+                # Revalider avant de rendre la main aux rafraîchissements périodiques
+                await asyncio.to_thread(self.spotify.refresh_state)
+        except Exception:
+            success = False
+        finally:
+            self.pending_commands -= 1
+
+        if not success:
+            rollback()
+            self.notify(failure_message, severity="error")
+
+    def add_track_optimistic(self, track: Track):
+        """Ajoute une piste à la liste d'attente sans attendre l'API"""
+        queue_widget = self.query_one("#queue", QueueWidget)
+
+        def apply():
+            queue_widget.tracks = list(queue_widget.tracks) + [track]
+            self.notify(f"✅ '{track.title}' ajoutée à la liste d'attente!")
+
+        def rollback():
+            queue_widget.tracks = [t for t in queue_widget.tracks if t is not track]
+
+        self.run_optimistic(
+            apply,
+            lambda: self.spotify.add_to_queue(track),
+            rollback,
+            f"❌ Erreur lors de l'ajout de '{track.title}'",
+        )
+
+    def action_play_pause(self):
+        """Action lecture/pause"""
+        current_widget = self.query_one("#current-track", CurrentTrackWidget)
+        previous = current_widget.track
+        play = not (previous.is_playing if previous else self.spotify.is_playing)
+
+        def apply():
+            if previous:
+                track = copy.copy(previous)
+                track.is_playing = play
+                current_widget.track = track
+
+        def rollback():
+            current_widget.track = previous
+
+        self.run_optimistic(
+            apply,
+            lambda: self.spotify.play_pause(play),
+            rollback,
+            "❌ Erreur lors de la reprise" if play else "❌ Erreur lors de la pause",
+        )
+
+    def action_next_track(self):
+        """Action piste suivante"""
+        current_widget = self.query_one("#current-track", CurrentTrackWidget)
+        queue_widget = self.query_one("#queue", QueueWidget)
+        previous = current_widget.track
+        previous_queue = list(queue_widget.tracks)
+
+        def apply():
+            if previous_queue:
+                track = copy.copy(previous_queue[0])
+                track.is_playing = True
+                track.progress_ms = 0
+                current_widget.track = track
+                queue_widget.tracks = previous_queue[1:]
+                if previous:
+                    self.history.append(previous)
+
+        def rollback():
+            if previous_queue:
+                if previous and self.history and self.history[-1] is previous:
+                    self.history.pop()
+                current_widget.track = previous
+                queue_widget.tracks = [previous_queue[0]] + list(queue_widget.tracks)
+
+        self.run_optimistic(
+            apply,
+            self.spotify.next_track,
+            rollback,
+            "❌ Erreur lors du passage à la piste suivante",
+        )
+
+    def action_previous_track(self):
+        """Action piste précédente"""
+        current_widget = self.query_one("#current-track", CurrentTrackWidget)
+        queue_widget = self.query_one("#queue", QueueWidget)
+        previous = current_widget.track
+        restored = self.history[-1] if self.history else None
+
+        def apply():
+            if restored:
+                self.history.pop()
+                track = copy.copy(restored)
+                track.is_playing = True
+                track.progress_ms = 0
+                current_widget.track = track
+                if previous:
+                    queue_widget.tracks = [previous] + list(queue_widget.tracks)
+
+        def rollback():
+            if restored:
+                self.history.append(restored)
+                current_widget.track = previous
+                if previous:
+                    queue_widget.tracks = [t for t in queue_widget.tracks if t is not previous]
+
+        self.run_optimistic(
+            apply,
+            self.spotify.previous_track,
+            rollback,
+            "❌ Erreur lors du retour à la piste précédente",
+        )
 
     def show_search_screen(self):
         """Affiche l'écran de recherche"""
@@ -570,6 +631,20 @@ class SpotifyApp(App):
         """Nettoie les résultats de l'écran de recherche"""
         self.query_one("#search-results-screen", ListView).clear()
 
+    def action_toggle_memory_profiler(self):
+        """Active le profilage mémoire, ou écrit le rapport et le désactive"""
+        if not self.memory_profiler.active:
+            self.memory_profiler.start()
+            self.notify("🧠 Profilage mémoire activé (M pour le rapport)")
+            return
+
+        report = self.memory_profiler.report(limit=20)
+        with open(self.MEMORY_REPORT_PATH, "w", encoding="utf-8") as report_file:
+            report_file.write(report + "\n")
+        self.memory_profiler.stop()
+        summary = "\n".join(report.splitlines()[:6])
+        self.notify(f"🧠 Rapport écrit dans {self.MEMORY_REPORT_PATH}\n{summary}", timeout=10)
+
     def action_quit(self):
         """Action quitter"""
         self.exit()
@@ -577,7 +652,10 @@ class SpotifyApp(App):
 
 def main():
     """Point d'entrée de l'application"""
-    app = SpotifyApp()
+    try:
+        app = SpotifyApp()
+    except SpotifyConfigError as e:
+        raise SystemExit(str(e))
     app.run()
 
 
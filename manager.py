@@ -0,0 +1,310 @@
+"""
+Gestion de la lecture Spotify, indépendante de l'interface Textual.
+"""
+
+from concurrent.futures import Future
+from datetime import datetime
+from typing import List, Optional, Dict
+
+import spotify
+from commands import CommandQueue
+from statesync import PlaybackState, StateDecoder, StateEncoder, StateSyncError
+
+
+class Track:
+    """Représente une piste musicale"""
+    def __init__(self, track_data: Dict = None, title: str = None, artist: str = None, album: str = None, track_id: str = None):
+        if track_data:
+            # Création à partir des données Spotify
+            self.id = track_data.get('id', '')
+            self.title = track_data.get('name', '') or track_data.get('title', '')
+            self.artist = track_data.get('artist', '')
+            self.album = track_data.get('album', '')
+            self.is_playing = track_data.get('is_playing', False)
+            self.progress_ms = track_data.get('progress_ms', 0)
+            self.duration_ms = track_data.get('duration_ms', 0)
+        else:
+            # Création manuelle (pour compatibilité)
+            self.id = track_id or ''
+            self.title = title or ''
+            self.artist = artist or ''
+            self.album = album or ''
+            self.is_playing = False
+            self.progress_ms = 0
+            self.duration_ms = 0
+        
+        # Vrai si la piste provient d'un snapshot qui n'a pas pu être revalidé
+        self.stale = False
+        self.added_at = datetime.now()
+
+    def __str__(self):
+        return f"{self.title} - {self.artist}"
+
+    def to_dict(self) -> Dict:
+        """Représentation sérialisable en JSON"""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'artist': self.artist,
+            'album': self.album,
+            'duration_ms': self.duration_ms,
+            'progress_ms': self.progress_ms,
+            'is_playing': self.is_playing,
+            'stale': self.stale,
+        }
+
+
+class SpotifyManager:
+    """
+    Gestionnaire pour l'API Spotify
+
+    Args:
+        client: Compte Spotify à piloter (par défaut, celui configuré dans .env)
+        features_cache_path: Fichier de cache des caractéristiques audio
+    """
+
+    LOCAL_QUEUE_LIMIT = 100  # Nombre maximum de pistes suivies localement
+    
+    def __init__(self, client: Optional[spotify.SpotifyClient] = None,
+                 features_cache_path: str = ".features_cache.json"):
+        if client is None and spotify.default_client.sp is None:
+            # Sans compte, chaque appel échouerait : on s'arrête dès le démarrage
+            raise spotify.SpotifyConfigError(
+                "Aucun compte Spotify configuré : définir SPOTIPY_CLIENT_ID et SPOTIPY_CLIENT_SECRET (voir .env)"
+            )
+        self.client = client or spotify.default_client
+        self.features_cache_path = features_cache_path
+        self.local_queue = []  # Queue locale pour compenser les limitations de l'API
+        self.is_playing = False
+        self._play_command: Future = Future()  # Dernière commande lecture/pause envoyée
+        self._play_command.set_result(True)
+        self.current_track_id: Optional[str] = None  # Piste en cours à la dernière lecture valide
+        self.queue_stale = False  # Vrai si la queue affichée n'a pas pu être revalidée
+        # Toutes les écritures passent par une file unique qui regroupe les commandes
+        self.commands = CommandQueue({
+            'add': self.client.AddtoQueue,
+            'skip': self.client.skipTracks,
+            'play': lambda play: self.client.resumePlayback() if play else self.client.pausePlayback(),
+        })
+        self._autofill = None
+        # Synchronisation compacte de l'état avec les clients web
+        self.state_encoder = StateEncoder()
+        self.state_decoder = StateDecoder()
+
+    @property
+    def autofill(self):
+        """Moteur qui complète la queue quand elle se vide, pour que la fête continue"""
+        if self._autofill is None:
+            # Import différé : NumPy ralentirait le démarrage du mode démon
+            from autofill import AutoFill, FeatureStore
+            self._autofill = AutoFill(
+                FeatureStore(self.client.getAudioFeatures, path=self.features_cache_path),
+                recent_fetcher=self.client.getRecentlyPlayed,
+                enqueue=lambda track_id: self.commands.submit('add', track_id),
+            )
+        return self._autofill
+
+    def get_current_track(self) -> Optional[Track]:
+        """Récupère la piste actuellement en cours (dernier état connu si l'API est en panne)"""
+        snapshot = self.client.getCurrentPlayingTrackSnapshot()
+        track_data = snapshot.value
+        if not snapshot.stale:
+            self.current_track_id = track_data['id'] if track_data else None
+        if track_data:
+            track = Track(track_data=track_data)
+            track.stale = snapshot.stale
+            if not snapshot.stale:
+                if self._play_command.done():
+                    # Tant qu'une commande est en attente, l'état attendu prime
+                    self.is_playing = track.is_playing
+                self.autofill.record_played(track_data)
+            return track
+        return None
+
+    def get_queue(self) -> List[Track]:
+        """Récupère la liste d'attente (queue locale + API)"""
+        # Récupérer la queue depuis l'API Spotify (dernier état connu si l'API est en panne)
+        snapshot = self.client.getQueueSnapshot()
+        self.queue_stale = snapshot.stale
+        api_queue = snapshot.value
+        tracks = []
+        
+        # Convertir les dictionnaires en objets Track
+        for track_data in api_queue:
+            tracks.append(Track(track_data=track_data))
+
+        if tracks and not snapshot.stale:
+            # Oublier les pistes ajoutées qui ont déjà été jouées
+            queued_ids = {track.id for track in tracks}
+            self.local_queue = [
+                track for track in self.local_queue
+                if not track.id or track.id in queued_ids
+            ]
+        if not snapshot.stale:
+            # La piste en cours ne doit pas être proposée à nouveau
+            self.autofill.request_top_up([track.id for track in tracks], self.current_track_id)
+        
+        # Si pas de queue API, utiliser la queue locale
+        if not tracks:
+            tracks = self.local_queue
+            
+        return tracks
+
+    def add_to_queue(self, track: Track):
+        """Ajoute une piste à la queue"""
+        if track.id:
+            # Ajouter via l'API Spotify
+            return self.submit_add(track).result()
+        # Ajouter à la queue locale seulement
+        self._append_local(track)
+        return True
+
+    def submit_add(self, track: Track) -> Future:
+        """Envoie l'ajout d'une piste à la file de commandes, sans attendre"""
+        def on_done(future: Future):
+            if future.result():
+                self._append_local(track)
+
+        return _then(self.commands.submit('add', track.id), on_done)
+
+    def _append_local(self, track: Track):
+        """Ajoute une piste à la queue locale en bornant sa taille"""
+        self.local_queue.append(track)
+        del self.local_queue[:-self.LOCAL_QUEUE_LIMIT]
+
+    def search_tracks(self, query: str) -> List[Track]:
+        """Recherche des pistes sur Spotify"""
+        results = self.client.SearchSong(query, limit=10)
+        self.autofill.add_candidates(results)
+        tracks = []
+        for track_data in results:
+            tracks.append(Track(track_data=track_data))
+        return tracks
+
+    def play_pause(self, play: Optional[bool] = None):
+        """
+        Toggle play/pause
+
+        Args:
+            play: État souhaité ; par défaut, inverse le dernier état connu
+                  (sans requête supplémentaire à l'API)
+        """
+        return self.submit_play(play).result()
+
+    def submit_play(self, play: Optional[bool] = None) -> Future:
+        """Envoie lecture (True) ou pause (False) à la file de commandes, sans attendre"""
+        if play is None:
+            play = not self.is_playing
+        previous = self.is_playing
+        # État attendu mis à jour dès l'envoi, comme dans l'interface : un
+        # second appui rapide inverse bien le premier
+        self.is_playing = play
+        command = self._play_command = self.commands.submit('play', play)
+
+        def on_done(future: Future):
+            if not future.result() and self._play_command is future:
+                self.is_playing = previous
+
+        return _then(command, on_done)
+
+    def next_track(self):
+        """Passe à la piste suivante"""
+        return self.submit_skip(1).result()
+
+    def previous_track(self):
+        """Revient à la piste précédente"""
+        return self.submit_skip(-1).result()
+
+    def submit_skip(self, count: int) -> Future:
+        """Envoie un saut de piste(s) à la file de commandes, sans attendre"""
+        def on_done(future: Future):
+            if future.result() and count > 0:
+                # Retirer les pistes passées de notre queue locale
+                del self.local_queue[:count]
+
+        return _then(self.commands.submit('skip', count), on_done)
+
+    def play_track(self, track: Track):
+        """Joue une piste spécifique"""
+        if track.id:
+            return self.client.playTrack(track.id)
+        return False
+
+    def remove_from_queue(self, track: Track):
+        """Supprime une piste de la queue locale"""
+        if track in self.local_queue:
+            self.local_queue.remove(track)
+            return True
+        return False
+
+    def encode_state(self, current: Optional[Track], queue: List[Track]) -> Optional[bytes]:
+        """
+        Encode les changements d'état à diffuser aux clients
+
+        Args:
+            current: Piste en cours, telle que retournée par get_current_track
+            queue: Liste d'attente, telle que retournée par get_queue
+
+        Returns:
+            Un delta (ou un snapshot), None si rien n'a changé
+        """
+        return self.state_encoder.update(PlaybackState.from_tracks(current, queue))
+
+    def state_snapshot(self) -> bytes:
+        """Snapshot complet pour un client qui se connecte ou se resynchronise"""
+        return self.state_encoder.snapshot()
+
+    def apply_state(self, payload: bytes) -> bool:
+        """
+        Applique un message de synchronisation reçu d'un serveur
+
+        Returns:
+            True si l'état est à jour, False s'il faut demander un snapshot
+        """
+        try:
+            self.state_decoder.apply(payload)
+            return True
+        except StateSyncError as e:
+            print(f"Erreur de synchronisation, resynchronisation nécessaire: {e}")
+            return False
+
+    def synced_current_track(self) -> Optional[Track]:
+        """Piste en cours selon l'état synchronisé"""
+        track_data = self.state_decoder.current
+        if not track_data:
+            return None
+        track = Track(track_data=track_data)
+        track.is_playing = self.state_decoder.is_playing
+        track.progress_ms = self.state_decoder.progress_ms
+        return track
+
+    def synced_queue(self) -> List[Track]:
+        """Liste d'attente selon l'état synchronisé"""
+        return [Track(track_data=track_data) for track_data in self.state_decoder.queue]
+
+    def command_latencies(self) -> Dict[str, Dict[str, float]]:
+        """Latence des commandes d'écriture par type (en millisecondes)"""
+        return self.commands.latency_stats()
+
+    def refresh_state(self):
+        """Revalide la piste en cours et la queue après une commande (bloquant)"""
+        self.client.refreshSnapshots()
+
+
+def _then(future: Future, callback) -> Future:
+    """
+    Retourne un Future résolu après l'exécution de callback
+
+    Contrairement à add_done_callback, les appelants qui attendent le
+    résultat voient les effets de callback.
+    """
+    chained = Future()
+
+    def on_done(done: Future):
+        try:
+            callback(done)
+        finally:
+            chained.set_result(done.result())
+
+    future.add_done_callback(on_done)
+    return chained
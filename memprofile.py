@@ -0,0 +1,104 @@
+"""
+Instrumentation mémoire basée sur tracemalloc, activable à chaud.
+"""
+
+import os
+import sys
+import tracemalloc
+from typing import List, Tuple
+
+
+class MemoryProfiler:
+    """
+    Profileur mémoire regroupant les allocations par module
+
+    Args:
+        frames: Nombre de frames conservées par allocation (1 suffit pour
+                regrouper par module, plus permet d'analyser les appelants)
+    """
+
+    def __init__(self, frames: int = 1):
+        self.frames = frames
+
+    @property
+    def active(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        """Démarre le suivi des allocations"""
+        if not self.active:
+            tracemalloc.start(self.frames)
+
+    def stop(self):
+        """Arrête le suivi et libère les traces"""
+        if self.active:
+            tracemalloc.stop()
+
+    def toggle(self) -> bool:
+        """
+        Active ou désactive le suivi
+
+        Returns:
+            True si le suivi est maintenant actif
+        """
+        if self.active:
+            self.stop()
+        else:
+            self.start()
+        return self.active
+
+    def traced_memory(self) -> Tuple[int, int]:
+        """Mémoire suivie (courante, pic) en octets"""
+        if not self.active:
+            return 0, 0
+        return tracemalloc.get_traced_memory()
+
+    def top_allocators(self, limit: int = 10) -> List[Tuple[str, int, int]]:
+        """
+        Retourne les modules qui allouent le plus
+
+        Returns:
+            Liste de tuples (module, taille en octets, nombre de blocs)
+        """
+        if not self.active:
+            return []
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib.*>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ])
+        by_module = {}
+        for stat in snapshot.statistics('filename'):
+            module = module_name(stat.traceback[0].filename)
+            size, count = by_module.get(module, (0, 0))
+            by_module[module] = (size + stat.size, count + stat.count)
+
+        ranked = sorted(by_module.items(), key=lambda item: item[1][0], reverse=True)
+        return [(module, size, count) for module, (size, count) in ranked[:limit]]
+
+    def report(self, limit: int = 10) -> str:
+        """Rapport texte des principaux allocateurs"""
+        if not self.active:
+            return "Profilage mémoire inactif"
+        current, peak = self.traced_memory()
+        lines = [f"Mémoire suivie: {current / 1024:.1f} Ko (pic {peak / 1024:.1f} Ko)"]
+        for module, size, count in self.top_allocators(limit):
+            lines.append(f"{size / 1024:10.1f} Ko  {count:8d} blocs  {module}")
+        return "\n".join(lines)
+
+
+def module_name(filename: str) -> str:
+    """Convertit un chemin de fichier en nom de module importable"""
+    path = os.path.abspath(filename)
+    best = ""
+    for entry in sys.path:
+        entry = os.path.abspath(entry or os.curdir)
+        if path.startswith(entry + os.sep) and len(entry) > len(best):
+            best = entry
+    if not best:
+        return filename
+    relative = os.path.splitext(path[len(best) + 1:])[0]
+    module = relative.replace(os.sep, ".")
+    if module.endswith(".__init__"):
+        module = module[:-len(".__init__")]
+    return module
@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+Hébergement de plusieurs salles, chacune avec son propre compte Spotify.
+
+Chaque salle a son client, son jeton OAuth, sa queue, sa file de commandes et
+son poller, et sert l'API JSON du mode démon sur son propre port (ou socket).
+Les salles sont réparties entre plusieurs processus ; le superviseur relance
+les processus qui s'arrêtent et affiche les métriques de chaque salle.
+
+    python rooms.py --login salon       # authentification OAuth, une fois par salle
+    python rooms.py --config rooms.json --workers 2
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Deque, Dict, List, Optional, Set
+
+from daemon import READ_METHODS, WRITE_METHODS, Daemon, RequestError
+from manager import SpotifyManager
+from spotify import REDIRECT_URL, SpotifyClient, createSpotify
+
+
+class RoomLimits:
+    """
+    Limites de ressources d'une salle
+
+    Args:
+        requests_per_second: Débit moyen de requêtes autorisé (rafales du double)
+        max_batch: Nombre maximum de requêtes par lot
+        max_connections: Nombre maximum de connexions simultanées
+        max_queue: Taille de queue au-delà de laquelle les ajouts sont refusés
+    """
+
+    def __init__(self, requests_per_second: float = 20.0, max_batch: int = 50,
+                 max_connections: int = 32, max_queue: int = 100):
+        self.requests_per_second = requests_per_second
+        self.max_batch = max_batch
+        self.max_connections = max_connections
+        self.max_queue = max_queue
+
+
+class RoomMetrics:
+    """Compteurs d'une salle"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+        self.connections = 0
+        self.total_connections = 0
+        self.methods: Dict[str, List[float]] = {}  # méthode -> [nombre, durée totale]
+
+    def record(self, method: str, duration: float, failed: bool):
+        self.requests += 1
+        if failed:
+            self.errors += 1
+        count, total = self.methods.get(method, (0, 0.0))
+        self.methods[method] = [count + 1, total + duration]
+
+    def to_dict(self) -> Dict:
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'rejected': self.rejected,
+            'connections': self.connections,
+            'total_connections': self.total_connections,
+            'methods': {
+                method: {'count': count, 'mean_ms': total / count * 1000}
+                for method, (count, total) in self.methods.items()
+            },
+        }
+
+
+class RoomDaemon(Daemon):
+    """API JSON d'une salle, avec limites de ressources et métriques"""
+
+    def __init__(self, name: str, manager: SpotifyManager, limits: RoomLimits,
+                 poll_interval: float = 3.0):
+        super().__init__(manager, poll_interval=poll_interval)
+        self.name = name
+        self.limits = limits
+        self.metrics = RoomMetrics()
+        self._tokens = 2 * limits.requests_per_second
+        self._tokens_at = time.monotonic()
+        # Ajouts pas encore visibles dans le snapshot de la queue
+        self._pending_adds: Set[Future] = set()
+        self._added_at: Deque[float] = deque()  # Fins des ajouts réussis (modifiée par la file d'écriture)
+
+    async def handle_batch(self, requests: List[Dict]) -> List[Dict]:
+        if len(requests) > self.limits.max_batch:
+            self.metrics.rejected += len(requests)
+            error = f"Lot trop grand (maximum {self.limits.max_batch} requêtes)"
+            return [{'id': _request_id(request), 'error': error} for request in requests]
+
+        allowed = []
+        responses: Dict[int, Dict] = {}
+        for index, request in enumerate(requests):
+            if self._take_token():
+                allowed.append(index)
+            else:
+                self.metrics.rejected += 1
+                responses[index] = {'id': _request_id(request), 'error': "Limite de requêtes atteinte"}
+
+        results = await super().handle_batch([requests[index] for index in allowed])
+        for index, response in zip(allowed, results):
+            responses[index] = response
+        return [responses[index] for index in range(len(requests))]
+
+    def _dispatch(self, request, reads: Dict[str, asyncio.Future]) -> asyncio.Future:
+        """Mesure chaque requête séparément, de sa soumission à son résultat"""
+        method = request.get('method') if isinstance(request, dict) else None
+        if method not in READ_METHODS + WRITE_METHODS:
+            method = 'invalid'  # Noms arbitraires regroupés : les métriques restent bornées
+        start = time.perf_counter()
+        try:
+            future = super()._dispatch(request, reads)
+        except Exception:
+            self.metrics.record(method, time.perf_counter() - start, failed=True)
+            raise
+
+        def on_done(done: asyncio.Future):
+            failed = done.cancelled() or done.exception() is not None
+            self.metrics.record(method, time.perf_counter() - start, failed)
+
+        future.add_done_callback(on_done)
+        return future
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if self.metrics.connections >= self.limits.max_connections:
+            self.metrics.rejected += 1
+            writer.write(json.dumps({'id': None, 'error': "Trop de connexions"}).encode("utf-8") + b"\n")
+            writer.close()
+            return
+        self.metrics.connections += 1
+        self.metrics.total_connections += 1
+        try:
+            await super().handle_connection(reader, writer)
+        finally:
+            self.metrics.connections -= 1
+
+    def subscribe(self, request: Dict, writer: asyncio.StreamWriter) -> Dict:
+        # Chaque abonnement encode un snapshot complet : soumis au même débit
+        if not self._take_token():
+            self.metrics.rejected += 1
+            return {'id': request.get('id'), 'error': "Limite de requêtes atteinte"}
+        start = time.perf_counter()
+        try:
+            reply = super().subscribe(request, writer)
+        except Exception:
+            self.metrics.record('subscribe', time.perf_counter() - start, failed=True)
+            raise
+        self.metrics.record('subscribe', time.perf_counter() - start, failed=False)
+        return reply
+
+    def room_metrics(self) -> Dict:
+        """Métriques de la salle : API locale, commandes et état du compte Spotify"""
+        client = self.manager.client
+        return {
+            'room': self.name,
+            'api': self.metrics.to_dict(),
+            'commands': self.manager.command_latencies(),
+            'breaker': client.breaker.state,
+            'queue_length': len(client.queue_cache.snapshot().value),
+            'queue_stale': self.manager.queue_stale,
+        }
+
+    def _read(self, method: str, params: Dict):
+        if method == 'metrics':
+            return self.room_metrics()
+        return super()._read(method, params)
+
+    def _submit(self, method: str, params: Dict):
+        if method != 'enqueue':
+            return super()._submit(method, params)
+        if self._queued_tracks() >= self.limits.max_queue:
+            raise RequestError(f"Queue pleine (maximum {self.limits.max_queue} pistes)")
+        future = super()._submit(method, params)
+        self._pending_adds.add(future)
+
+        def on_done(done: Future):
+            if not done.cancelled() and done.exception() is None and done.result():
+                self._added_at.append(time.monotonic())
+
+        future.add_done_callback(on_done)
+        return future
+
+    def _queued_tracks(self) -> int:
+        """
+        Taille de la queue en comptant les ajouts en cours et ceux terminés
+        après la dernière lecture de la queue (le snapshot peut dater de 3 s)
+        """
+        snapshot = self.manager.client.queue_cache.snapshot()
+        fetched_at = snapshot.fetched_at if snapshot.fetched_at is not None else float('-inf')
+        while self._added_at and self._added_at[0] <= fetched_at:
+            self._added_at.popleft()
+        self._pending_adds = {future for future in self._pending_adds if not future.done()}
+        return len(snapshot.value) + len(self._pending_adds) + len(self._added_at)
+
+    def _take_token(self) -> bool:
+        """Seau à jetons : requests_per_second en moyenne, rafales du double"""
+        now = time.monotonic()
+        capacity = 2 * self.limits.requests_per_second
+        self._tokens = min(capacity, self._tokens + (now - self._tokens_at) * self.limits.requests_per_second)
+        self._tokens_at = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+def _request_id(request) -> Optional[object]:
+    return request.get('id') if isinstance(request, dict) else None
+
+
+def create_room(config: Dict) -> RoomDaemon:
+    """Crée une salle isolée : client, jeton, queue, file de commandes et poller"""
+    name = config['name']
+    sp = createSpotify(
+        config['client_id'],
+        config['client_secret'],
+        config.get('redirect_url', REDIRECT_URL),
+        cache_path=f".cache-{name}",
+    )
+    manager = SpotifyManager(SpotifyClient(sp), features_cache_path=f".features_cache-{name}.json")
+    limits = RoomLimits(**config.get('limits', {}))
+    return RoomDaemon(name, manager, limits, poll_interval=config.get('poll_interval', 3.0))
+
+
+def load_config(path: str) -> Dict:
+    """
+    Charge et valide la configuration des salles
+
+    Raises:
+        ValueError: Si une salle est incomplète ou invalide, ou si deux salles
+                    se partagent un nom ou une adresse
+    """
+    with open(path, encoding="utf-8") as config_file:
+        config = json.load(config_file)
+
+    limit_keys = set(inspect.signature(RoomLimits).parameters)
+    names, addresses = set(), set()
+    for room in config.get('rooms', []):
+        for key in ('name', 'client_id', 'client_secret'):
+            if not room.get(key):
+                raise ValueError(f"Salle {room.get('name', '?')}: champ '{key}' manquant")
+        name = room['name']
+
+        if room.get('socket'):
+            address = room['socket']
+            if not os.path.isdir(os.path.dirname(os.path.abspath(address))):
+                raise ValueError(f"Salle {name}: dossier du socket introuvable")
+        elif _is_number(room.get('port'), integer=True) and 0 < room['port'] < 65536:
+            address = (room.get('host', '127.0.0.1'), room['port'])
+        else:
+            raise ValueError(f"Salle {name}: 'port' (1-65535) ou 'socket' requis")
+        if name in names or address in addresses:
+            raise ValueError(f"Salle {name}: nom ou adresse déjà utilisé")
+        names.add(name)
+        addresses.add(address)
+
+        if 'poll_interval' in room and not (_is_number(room['poll_interval']) and room['poll_interval'] >= 0):
+            raise ValueError(f"Salle {name}: 'poll_interval' doit être un nombre positif")
+        limits = room.get('limits', {})
+        if not isinstance(limits, dict):
+            raise ValueError(f"Salle {name}: 'limits' doit être un objet")
+        for key, value in limits.items():
+            if key not in limit_keys:
+                raise ValueError(f"Salle {name}: limite inconnue '{key}' (attendu : {', '.join(sorted(limit_keys))})")
+            if not (_is_number(value, integer=key != 'requests_per_second') and value > 0):
+                raise ValueError(f"Salle {name}: la limite '{key}' doit être un nombre strictement positif")
+    return config
+
+
+def check_addresses(rooms: List[Dict]):
+    """
+    Vérifie que les ports des salles sont libres avant de lancer les processus
+
+    Raises:
+        ValueError: Si un port est déjà utilisé
+    """
+    for room in rooms:
+        if room.get('socket'):
+            continue
+        host = room.get('host', '127.0.0.1')
+        try:
+            with socket.create_server((host, room['port'])):
+                pass
+        except OSError as e:
+            raise ValueError(f"Salle {room['name']}: impossible d'écouter sur {host}:{room['port']} ({e.strerror})")
+
+
+def _is_number(value, integer: bool = False) -> bool:
+    if isinstance(value, bool):
+        return False
+    return isinstance(value, int) if integer else isinstance(value, (int, float))
+
+
+def shard_rooms(rooms: List[Dict], workers: int) -> List[List[Dict]]:
+    """Répartit les salles entre les processus (tri par nom, puis tourniquet)"""
+    shards = [[] for _ in range(max(1, min(workers, len(rooms))))]
+    for index, room in enumerate(sorted(rooms, key=lambda room: room['name'])):
+        shards[index % len(shards)].append(room)
+    return shards
+
+
+def run_worker(shard: List[Dict], metrics_queue, metrics_interval: float):
+    """Point d'entrée d'un processus : sert toutes les salles de son lot"""
+    try:
+        asyncio.run(_serve_shard(shard, metrics_queue, metrics_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _serve_shard(shard: List[Dict], metrics_queue, metrics_interval: float):
+    rooms = [(config, create_room(config)) for config in shard]
+
+    async def report():
+        while True:
+            await asyncio.sleep(metrics_interval)
+            metrics_queue.put([room.room_metrics() for _, room in rooms])
+
+    servers = [
+        room.serve(config.get('host', '127.0.0.1'), config.get('port'), config.get('socket'))
+        for config, room in rooms
+    ]
+    await asyncio.gather(report(), *servers)
+
+
+# Un processus arrêté moins de STABLE_AFTER secondes après son lancement a planté
+# au démarrage : le délai avant relance double, et le lot est abandonné après
+# MAX_CRASHES plantages consécutifs
+RESTART_DELAY = 1.0
+MAX_RESTART_DELAY = 60.0
+STABLE_AFTER = 30.0
+MAX_CRASHES = 5
+
+
+def supervise(shards: List[List[Dict]], metrics_interval: float):
+    """Lance un processus par lot de salles et relance ceux qui s'arrêtent"""
+    context = multiprocessing.get_context("spawn")
+    metrics_queue = context.Queue()
+    started_at = [0.0] * len(shards)
+    crashes = [0] * len(shards)
+    restart_at: Dict[int, float] = {}
+
+    def start(index: int):
+        process = context.Process(
+            target=run_worker,
+            args=(shards[index], metrics_queue, metrics_interval),
+            name=f"rooms-{index}",
+            daemon=True,
+        )
+        process.start()
+        started_at[index] = time.monotonic()
+        names = ", ".join(room['name'] for room in shards[index])
+        print(f"Processus {index} (pid {process.pid}) : {names}")
+        return process
+
+    processes: List[Optional[multiprocessing.Process]] = [start(index) for index in range(len(shards))]
+    try:
+        while any(processes):
+            try:
+                for metrics in metrics_queue.get(timeout=1.0):
+                    api = metrics['api']
+                    print(f"[{metrics['room']}] requêtes={api['requests']} erreurs={api['errors']} "
+                          f"refusées={api['rejected']} connexions={api['connections']} "
+                          f"queue={metrics['queue_length']} disjoncteur={metrics['breaker']}")
+            except queue.Empty:
+                pass
+            now = time.monotonic()
+            for index, process in enumerate(processes):
+                if process is None or process.is_alive():
+                    continue
+                if index in restart_at:
+                    if now >= restart_at[index]:
+                        del restart_at[index]
+                        processes[index] = start(index)
+                    continue
+
+                crashes[index] = crashes[index] + 1 if now - started_at[index] < STABLE_AFTER else 0
+                if crashes[index] >= MAX_CRASHES:
+                    print(f"Processus {index} arrêté (code {process.exitcode}) : {crashes[index]} plantages "
+                          f"au démarrage, ses salles ne sont plus servies")
+                    processes[index] = None
+                    continue
+                delay = min(RESTART_DELAY * 2 ** crashes[index], MAX_RESTART_DELAY)
+                print(f"Processus {index} arrêté (code {process.exitcode}), redémarrage dans {delay:g} s")
+                restart_at[index] = now + delay
+        raise SystemExit("Plus aucune salle servie")
+    except KeyboardInterrupt:
+        for process in processes:
+            if process is not None:
+                process.terminate()
+
+
+def login(config: Dict, name: str):
+    """Authentifie une salle au premier plan pour créer son cache de jeton"""
+    rooms = {room['name']: room for room in config.get('rooms', [])}
+    if name not in rooms:
+        raise SystemExit(f"Salle inconnue: {name}")
+    room = create_room(rooms[name])
+    user = room.manager.client.sp.current_user()
+    print(f"Salle {name} connectée au compte {user.get('display_name') or user['id']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Héberge plusieurs salles BeatTogether")
+    parser.add_argument("--config", default="rooms.json")
+    parser.add_argument("--workers", type=int, help="Nombre de processus (défaut : config, sinon 1)")
+    parser.add_argument("--metrics-interval", type=float, default=30.0,
+                        help="Secondes entre deux rapports de métriques")
+    parser.add_argument("--login", metavar="SALLE", help="Authentifie une salle puis quitte")
+    args = parser.parse_args()
+
+    try:
+        config = load_config(args.config)
+        if args.login:
+            login(config, args.login)
+            return
+        rooms = config.get('rooms', [])
+        check_addresses(rooms)
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"Configuration invalide: {e}")
+
+    if not rooms:
+        raise SystemExit("Aucune salle configurée")
+    workers = args.workers or config.get('workers', 1)
+    supervise(shard_rooms(rooms, workers), args.metrics_interval)
+
+
+if __name__ == "__main__":
+    main()
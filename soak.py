@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Test d'endurance mémoire : fait tourner SpotifyApp contre un faux backend
+Spotify pendant plusieurs heures simulées et échoue si la mémoire grossit
+au-delà d'un seuil.
+
+    python soak.py --hours 8 --threshold-mb 10
+"""
+
+import argparse
+import asyncio
+import gc
+import itertools
+import os
+import random
+import sys
+import threading
+
+# Le vrai client n'est jamais appelé : des identifiants factices suffisent
+os.environ.setdefault("SPOTIPY_CLIENT_ID", "soak")
+os.environ.setdefault("SPOTIPY_CLIENT_SECRET", "soak")
+
+import spotify
+from main import SpotifyApp
+from memprofile import MemoryProfiler
+
+
+class FakeSpotify:
+    """Faux client spotipy : une file de lecture qui avance avec l'horloge simulée"""
+
+    TRACK_DURATION_MS = 180_000
+
+    def __init__(self, seed: int = 0):
+        self.random = random.Random(seed)
+        self.ids = itertools.count()
+        self.lock = threading.Lock()
+        self.current = self._make_track()
+        self.progress_ms = 0
+        self.is_playing = True
+        self.queue_items = [self._make_track() for _ in range(5)]
+
+    def _make_track(self, track_id: str = None):
+        number = next(self.ids)
+        return {
+            'id': track_id or f"track{number:08d}",
+            'name': f"Titre {number}",
+            'artists': [{'name': f"Artiste {self.random.randrange(200)}"}],
+            'album': {'name': f"Album {number % 500}", 'images': []},
+            'duration_ms': self.TRACK_DURATION_MS,
+            'preview_url': None,
+            'external_urls': {},
+        }
+
+    def advance(self, seconds: float):
+        """Fait avancer la lecture de l'horloge simulée"""
+        with self.lock:
+            if not self.is_playing:
+                return
+            self.progress_ms += int(seconds * 1000)
+            if self.progress_ms >= self.current['duration_ms']:
+                self._next()
+
+    def _next(self):
+        self.current = self.queue_items.pop(0) if self.queue_items else self._make_track()
+        self.progress_ms = 0
+        # Spotify complète la file avec des recommandations
+        while len(self.queue_items) < 5:
+            self.queue_items.append(self._make_track())
+
+    # API spotipy utilisée par spotify.py
+
+    def current_user_playing_track(self):
+        with self.lock:
+            return {'item': self.current, 'is_playing': self.is_playing,
+                    'progress_ms': self.progress_ms}
+
+    def queue(self):
+        with self.lock:
+            return {'currently_playing': self.current, 'queue': list(self.queue_items[:20])}
+
+    def search(self, q, type='track', limit=10):
+        return {'tracks': {'items': [self._make_track() for _ in range(limit)]}}
+
+    def audio_features(self, tracks):
+        # Caractéristiques stables par piste
+        features = []
+        for track_id in tracks:
+            generator = random.Random(track_id)
+            features.append({'id': track_id, 'danceability': generator.random(),
+                             'energy': generator.random(), 'valence': generator.random(),
+                             'tempo': generator.uniform(60, 180)})
+        return features
+
+    def current_user_recently_played(self, limit=50):
+        return {'items': []}
+
+    def add_to_queue(self, uri):
+        with self.lock:
+            self.queue_items.insert(0, self._make_track(track_id=uri))
+
+    def next_track(self):
+        with self.lock:
+            self._next()
+
+    def previous_track(self):
+        with self.lock:
+            self.progress_ms = 0
+
+    def start_playback(self, uris=None):
+        with self.lock:
+            self.is_playing = True
+
+    def pause_playback(self):
+        with self.lock:
+            self.is_playing = False
+
+
+async def soak(hours: float, warmup_minutes: float, threshold_mb: float, seed: int) -> bool:
+    """
+    Simule une session et mesure la croissance mémoire après l'échauffement
+
+    Returns:
+        True si la croissance reste sous le seuil
+    """
+    backend = FakeSpotify(seed)
+    spotify.default_client.sp = backend
+    profiler = MemoryProfiler(frames=1)
+
+    app = SpotifyApp()
+    total_ticks = int(hours * 3600)
+    warmup_ticks = min(int(warmup_minutes * 60), total_ticks // 2)
+    baseline = 0
+
+    async with app.run_test() as pilot:
+        for tick in range(total_ticks):
+            if tick == warmup_ticks:
+                gc.collect()
+                profiler.start()
+                baseline = profiler.traced_memory()[0]
+
+            backend.advance(1.0)
+            spotify.default_client.refreshSnapshots()
+            app.update_current_track()
+            if tick % 3 == 0:
+                app.update_queue()
+            if tick % 180 == 0:
+                # Un invité cherche et ajoute une piste à chaque morceau joué
+                results = await asyncio.to_thread(app.spotify.search_tracks, "soak")
+                if results:
+                    app.add_track_optimistic(results[0])
+            if tick % 900 == 0:
+                app.action_next_track()
+            if tick % 10 == 0:
+                await pilot.pause()
+            if tick and tick % 3600 == 0:
+                print(f"{tick // 3600} h simulée(s)")
+
+        await pilot.pause()
+        gc.collect()
+        growth = profiler.traced_memory()[0] - baseline
+        report = profiler.report(limit=15)
+        profiler.stop()
+
+    growth_mb = growth / (1024 * 1024)
+    print(f"Croissance mémoire après échauffement: {growth_mb:.2f} Mo (seuil {threshold_mb} Mo)")
+    if growth_mb > threshold_mb:
+        print(report)
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test d'endurance mémoire de SpotifyApp")
+    parser.add_argument("--hours", type=float, default=1.0, help="Durée simulée en heures")
+    parser.add_argument("--warmup-minutes", type=float, default=10.0,
+                        help="Durée simulée ignorée avant la mesure")
+    parser.add_argument("--threshold-mb", type=float, default=10.0,
+                        help="Croissance mémoire maximale tolérée")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    ok = asyncio.run(soak(args.hours, args.warmup_minutes, args.threshold_mb, args.seed))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,8 @@ from typing import List, Dict, Optional
 import os
 from dotenv import load_dotenv
 
+from cache import CircuitBreaker, Snapshot, SnapshotCache
+
 # Charger les variables d'environnement depuis le fichier .env
 load_dotenv()
 
@@ -12,32 +14,59 @@ SPOTIPY_CLIENT_ID = os.getenv('SPOTIPY_CLIENT_ID')
 SPOTIPY_CLIENT_SECRET = os.getenv('SPOTIPY_CLIENT_SECRET')
 REDIRECT_URL = os.getenv('REDIRECT_URL', 'http://localhost:8888/callback')
 
-# Initialisation du client Spotify
-sp = spotipy.Spotify(
-    auth_manager=SpotifyOAuth(
-        scope="user-read-currently-playing user-read-playback-state user-modify-playback-state user-read-recently-played",
-        redirect_uri=REDIRECT_URL,
-        client_id=SPOTIPY_CLIENT_ID,
-        client_secret=SPOTIPY_CLIENT_SECRET,
-    )
-)
+class SpotifyConfigError(Exception):
+    """Aucun compte Spotify configuré"""
+
 
-sp.user = "s7df1bggy7vp04apvg6dglu0t" #C'est moi wesh
+SCOPE = "user-read-currently-playing user-read-playback-state user-modify-playback-state user-read-recently-played"
 
 
-def getCurrentPlayingTrack() -> Optional[Dict]:
+def createSpotify(client_id: Optional[str], client_secret: Optional[str], redirect_uri: str,
+                  cache_path: Optional[str] = None) -> spotipy.Spotify:
     """
-    Récupère la piste actuellement en cours de lecture
-    
-    Returns:
-        Dict contenant les informations de la piste ou None si aucune piste n'est en cours
+    Crée un client spotipy pour un compte
+
+    Args:
+        cache_path: Fichier de cache du jeton OAuth (un par compte)
     """
-    try:
-        current_track = sp.current_user_playing_track()
-        
+    return spotipy.Spotify(
+        auth_manager=SpotifyOAuth(
+            scope=SCOPE,
+            redirect_uri=redirect_uri,
+            client_id=client_id,
+            client_secret=client_secret,
+            cache_path=cache_path,
+        )
+    )
+
+
+class SpotifyClient:
+    """
+    Accès à l'API Spotify pour un compte : client spotipy, disjoncteur et
+    caches de lecture qui lui sont propres
+
+    Args:
+        sp: Client spotipy authentifié pour ce compte
+    """
+
+    def __init__(self, sp: spotipy.Spotify):
+        self.sp = sp
+        # Disjoncteur partagé : toutes les lectures passent par la même API
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=5.0, max_reset_timeout=60.0)
+        self.current_track_cache = SnapshotCache(self._fetchCurrentPlayingTrack, default=None, ttl=1.0, breaker=self.breaker)
+        self.queue_cache = SnapshotCache(self._fetchQueue, default=[], ttl=3.0, breaker=self.breaker)
+        # Vrai si l'API refuse les caractéristiques audio à cette application
+        self.audio_features_forbidden = False
+
+    def _fetchCurrentPlayingTrack(self) -> Optional[Dict]:
+        """
+        Interroge l'API pour la piste en cours (lève une exception en cas d'échec)
+        """
+        current_track = self.sp.current_user_playing_track()
+
         if current_track is None or current_track['item'] is None:
             return None
-            
+
         track = current_track['item']
         return {
             'id': track['id'],
@@ -49,194 +78,351 @@ def getCurrentPlayingTrack() -> Optional[Dict]:
             'progress_ms': current_track['progress_ms'],
             'image_url': track['album']['images'][0]['url'] if track['album']['images'] else ''
         }
-    except Exception as e:
-        print(f"Erreur lors de la récupération de la piste en cours: {e}")
-        return None
 
-
-def getQueue() -> List[Dict]:
-    """
-    Récupère la liste d'attente actuelle
-    
-    Returns:
-        Liste des pistes en attente
-    """
-    try:
-        # Note: L'API Spotify ne permet pas de récupérer directement la queue
-        # Cette fonction retourne une liste vide pour l'instant
-        # Dans une vraie implémentation, il faudrait maintenir une queue locale
-
-        results = sp.queue()
+    def _fetchQueue(self) -> List[Dict]:
+        """
+        Interroge l'API pour la liste d'attente (lève une exception en cas d'échec)
+        """
+        results = self.sp.queue()
 
         tracks = []
         for item in results['queue']:
-            print(item.keys())
             tracks.append({
                 'id': item['id'],
                 'title': item['name'],
                 'artist': ', '.join([artist['name'] for artist in item['artists']]),
                 'album': item['album']['name'],
+                'duration_ms': item['duration_ms'],
             })
 
         return tracks
-    except Exception as e:
-        print(f"Erreur lors de la récupération de la queue: {e}")
-        return []
 
+    def getCurrentPlayingTrackSnapshot(self) -> Snapshot:
+        """
+        Récupère le dernier état connu de la piste en cours
 
-print(getQueue())
+        Returns:
+            Snapshot dont la valeur est le dict de la piste (ou None) et dont
+            l'attribut stale indique si l'état n'a pas pu être revalidé
+        """
+        return self.current_track_cache.get()
 
+    def getQueueSnapshot(self) -> Snapshot:
+        """
+        Récupère le dernier état connu de la liste d'attente
 
+        Returns:
+            Snapshot dont la valeur est la liste des pistes en attente
+        """
+        return self.queue_cache.get()
 
-def SearchSong(query: str, limit: int = 10) -> List[Dict]:
-    """
-    Recherche des pistes sur Spotify
-    
-    Args:
-        query: Terme de recherche
-        limit: Nombre maximum de résultats (défaut: 10)
-    
-    Returns:
-        Liste des pistes trouvées
-    """
-    try:
-        results = sp.search(q=query, type='track', limit=limit)
-        tracks = []
-        
-        for track in results['tracks']['items']:
-            tracks.append({
-                'id': track['id'],
-                'name': track['name'],
-                'artist': ', '.join([artist['name'] for artist in track['artists']]),
-                'album': track['album']['name'],
-                'duration_ms': track['duration_ms'],
-                'preview_url': track['preview_url'],
-                'external_urls': track['external_urls'],
-                'image_url': track['album']['images'][0]['url'] if track['album']['images'] else ''
-            })
-        
-        return tracks
-    except Exception as e:
-        print(f"Erreur lors de la recherche: {e}")
-        return []
+    def getCurrentPlayingTrack(self) -> Optional[Dict]:
+        """
+        Récupère la piste actuellement en cours de lecture
 
+        Returns:
+            Dict contenant les informations de la piste ou None si aucune piste n'est en cours
+        """
+        return self.getCurrentPlayingTrackSnapshot().value
 
-def AddtoQueue(track_id: str) -> bool:
-    """
-    Ajoute une piste à la queue
-    
-    Args:
-        track_id: ID de la piste à ajouter
-    
-    Returns:
-        True si l'ajout a réussi, False sinon
-    """
-    try:
-        sp.add_to_queue(track_id)
-        return True
-    except Exception as e:
-        print(f"Erreur lors de l'ajout à la queue: {e}")
-        return False
+    def getQueue(self) -> List[Dict]:
+        """
+        Récupère la liste d'attente actuelle
 
+        Returns:
+            Liste des pistes en attente
+        """
+        return self.getQueueSnapshot().value
 
-def DeletefromQueue(track_id: str) -> bool:
-    """
-    Supprime une piste de la queue
-    
-    Args:
-        track_id: ID de la piste à supprimer
-    
-    Returns:
-        True si la suppression a réussi, False sinon
-    
-    Note:
-        L'API Spotify ne permet pas de supprimer directement de la queue
-        Cette fonction est un placeholder pour une future implémentation
-    """
-    try:
-        # L'API Spotify ne permet pas de supprimer directement de la queue
-        # Il faudrait maintenir une queue locale et la gérer manuellement
-        print(f"Suppression de la piste {track_id} de la queue (non implémentée)")
-        return False
-    except Exception as e:
-        print(f"Erreur lors de la suppression de la queue: {e}")
-        return False
-
-
-# Fonctions utilitaires supplémentaires
-def playTrack(track_id: str) -> bool:
-    """
-    Lance la lecture d'une piste
-    
-    Args:
-        track_id: ID de la piste à jouer
-    
-    Returns:
-        True si la lecture a démarré, False sinon
-    """
-    try:
-        sp.start_playback(uris=[f"spotify:track:{track_id}"])
-        return True
-    except Exception as e:
-        print(f"Erreur lors de la lecture: {e}")
-        return False
+    def invalidateSnapshots(self):
+        """Force la revalidation des snapshots après une commande d'écriture"""
+        self.current_track_cache.invalidate()
+        self.queue_cache.invalidate()
 
+    def refreshSnapshots(self):
+        """Revalide immédiatement les snapshots (appel bloquant)"""
+        self.current_track_cache.refresh()
+        self.queue_cache.refresh()
 
-def pausePlayback() -> bool:
-    """
-    Met en pause la lecture
-    
-    Returns:
-        True si la pause a réussi, False sinon
-    """
-    try:
-        sp.pause_playback()
-        return True
-    except Exception as e:
-        print(f"Erreur lors de la pause: {e}")
-        return False
+    def SearchSong(self, query: str, limit: int = 10) -> List[Dict]:
+        """
+        Recherche des pistes sur Spotify
 
+        Args:
+            query: Terme de recherche
+            limit: Nombre maximum de résultats (défaut: 10)
 
-def resumePlayback() -> bool:
-    """
-    Reprend la lecture
-    
-    Returns:
-        True si la reprise a réussi, False sinon
-    """
-    try:
-        sp.start_playback()
-        return True
-    except Exception as e:
-        print(f"Erreur lors de la reprise: {e}")
-        return False
+        Returns:
+            Liste des pistes trouvées
+        """
+        if not self.breaker.allow_request():
+            # API indisponible : on évite d'ajouter de la charge pendant la panne
+            return []
+        try:
+            results = self.sp.search(q=query, type='track', limit=limit)
+            tracks = []
 
+            for track in results['tracks']['items']:
+                tracks.append({
+                    'id': track['id'],
+                    'name': track['name'],
+                    'artist': ', '.join([artist['name'] for artist in track['artists']]),
+                    'album': track['album']['name'],
+                    'duration_ms': track['duration_ms'],
+                    'preview_url': track['preview_url'],
+                    'external_urls': track['external_urls'],
+                    'image_url': track['album']['images'][0]['url'] if track['album']['images'] else ''
+                })
 
-def nextTrack() -> bool:
-    """
-    Passe à la piste suivante
-    
-    Returns:
-        True si le changement a réussi, False sinon
-    """
-    try:
-        sp.next_track()
-        return True
-    except Exception as e:
-        print(f"Erreur lors du passage à la piste suivante: {e}")
-        return False
+            self.breaker.record_success()
+            return tracks
+        except Exception as e:
+            print(f"Erreur lors de la recherche: {e}")
+            self.breaker.record_failure()
+            return []
 
+    def getRecentlyPlayed(self, limit: int = 50) -> List[Dict]:
+        """
+        Récupère les pistes écoutées récemment
 
-def previousTrack() -> bool:
-    """
-    Revient à la piste précédente
-    
-    Returns:
-        True si le changement a réussi, False sinon
-    """
-    try:
-        sp.previous_track()
+        Args:
+            limit: Nombre maximum de pistes (50 au plus)
+
+        Returns:
+            Liste des pistes, de la plus récente à la plus ancienne
+        """
+        if not self.breaker.allow_request():
+            return []
+        try:
+            results = self.sp.current_user_recently_played(limit=limit)
+            tracks = []
+
+            for item in results['items']:
+                track = item['track']
+                tracks.append({
+                    'id': track['id'],
+                    'name': track['name'],
+                    'artist': ', '.join([artist['name'] for artist in track['artists']]),
+                    'album': track['album']['name'],
+                    'duration_ms': track['duration_ms'],
+                })
+
+            self.breaker.record_success()
+            return tracks
+        except Exception as e:
+            print(f"Erreur lors de la récupération de l'historique: {e}")
+            self.breaker.record_failure()
+            return []
+
+    def getAudioFeatures(self, track_ids: List[str], batch_size: int = 100) -> Dict[str, Optional[Dict]]:
+        """
+        Récupère les caractéristiques audio de plusieurs pistes, par lots
+
+        Args:
+            track_ids: IDs des pistes
+            batch_size: Nombre de pistes par requête (100 au plus côté API)
+
+        Returns:
+            Dict des caractéristiques par ID de piste : None pour une piste
+            sans caractéristiques dans un lot qui a répondu ; les pistes des
+            lots qui ont échoué ou n'ont pas été demandés sont absentes
+        """
+        features = {}
+        if self.audio_features_forbidden:
+            return features
+        for start in range(0, len(track_ids), batch_size):
+            if not self.breaker.allow_request():
+                break
+            batch = track_ids[start:start + batch_size]
+            try:
+                results = self.sp.audio_features(batch)
+            except Exception as e:
+                print(f"Erreur lors de la récupération des caractéristiques audio: {e}")
+                if _isClientError(e):
+                    # Requête refusée, pas une panne : l'API a répondu, ce qui
+                    # libère aussi la sonde si le disjoncteur était entrouvert
+                    self.audio_features_forbidden = e.http_status == 403
+                    self.breaker.record_success()
+                else:
+                    self.breaker.record_failure()
+                break
+            self.breaker.record_success()
+            results = results or []
+            for index, track_id in enumerate(batch):
+                features[track_id] = results[index] if index < len(results) else None
+        return features
+
+    def AddtoQueue(self, track_id: str) -> bool:
+        """
+        Ajoute une piste à la queue
+
+        Args:
+            track_id: ID de la piste à ajouter
+
+        Returns:
+            True si l'ajout a réussi, False sinon
+        """
+        try:
+            self.sp.add_to_queue(track_id)
+            self.invalidateSnapshots()
+            return True
+        except Exception as e:
+            print(f"Erreur lors de l'ajout à la queue: {e}")
+            return False
+
+    def DeletefromQueue(self, track_id: str) -> bool:
+        """
+        Supprime une piste de la queue
+
+        Args:
+            track_id: ID de la piste à supprimer
+
+        Returns:
+            True si la suppression a réussi, False sinon
+
+        Note:
+            L'API Spotify ne permet pas de supprimer directement de la queue
+            Cette fonction est un placeholder pour une future implémentation
+        """
+        try:
+            # L'API Spotify ne permet pas de supprimer directement de la queue
+            # Il faudrait maintenir une queue locale et la gérer manuellement
+            print(f"Suppression de la piste {track_id} de la queue (non implémentée)")
+            return False
+        except Exception as e:
+            print(f"Erreur lors de la suppression de la queue: {e}")
+            return False
+
+    # Fonctions utilitaires supplémentaires
+    def playTrack(self, track_id: str) -> bool:
+        """
+        Lance la lecture d'une piste
+
+        Args:
+            track_id: ID de la piste à jouer
+
+        Returns:
+            True si la lecture a démarré, False sinon
+        """
+        try:
+            self.sp.start_playback(uris=[f"spotify:track:{track_id}"])
+            self.invalidateSnapshots()
+            return True
+        except Exception as e:
+            print(f"Erreur lors de la lecture: {e}")
+            return False
+
+    def pausePlayback(self) -> bool:
+        """
+        Met en pause la lecture
+
+        Returns:
+            True si la pause a réussi, False sinon
+        """
+        try:
+            self.sp.pause_playback()
+            self.invalidateSnapshots()
+            return True
+        except Exception as e:
+            print(f"Erreur lors de la pause: {e}")
+            return False
+
+    def resumePlayback(self) -> bool:
+        """
+        Reprend la lecture
+
+        Returns:
+            True si la reprise a réussi, False sinon
+        """
+        try:
+            self.sp.start_playback()
+            self.invalidateSnapshots()
+            return True
+        except Exception as e:
+            print(f"Erreur lors de la reprise: {e}")
+            return False
+
+    def nextTrack(self) -> bool:
+        """
+        Passe à la piste suivante
+
+        Returns:
+            True si le changement a réussi, False sinon
+        """
+        try:
+            self.sp.next_track()
+            self.invalidateSnapshots()
+            return True
+        except Exception as e:
+            print(f"Erreur lors du passage à la piste suivante: {e}")
+            return False
+
+    def previousTrack(self) -> bool:
+        """
+        Revient à la piste précédente
+
+        Returns:
+            True si le changement a réussi, False sinon
+        """
+        try:
+            self.sp.previous_track()
+            self.invalidateSnapshots()
+            return True
+        except Exception as e:
+            print(f"Erreur lors du retour à la piste précédente: {e}")
+            return False
+
+    def skipTracks(self, count: int) -> bool:
+        """
+        Avance ou recule de plusieurs pistes en une seule commande
+
+        Args:
+            count: Nombre de pistes à passer (négatif pour revenir en arrière)
+
+        Returns:
+            True si tous les changements ont réussi, False sinon
+
+        Note:
+            L'API Spotify n'a pas d'endpoint pour sauter plusieurs pistes ni
+            pour aller directement à une piste de la file d'attente : les
+            appels sont enchaînés sans relire l'état entre deux sauts
+        """
+        step = self.nextTrack if count > 0 else self.previousTrack
+        for _ in range(abs(count)):
+            if not step():
+                return False
         return True
-    except Exception as e:
-        print(f"Erreur lors du retour à la piste précédente: {e}")
-        return False
+
+
+def _isClientError(error: Exception) -> bool:
+    """Erreur 4xx de l'API (hors limitation de débit)"""
+    status = getattr(error, 'http_status', None)
+    return isinstance(error, spotipy.SpotifyException) and status is not None and 400 <= status < 500 and status != 429
+
+
+# Initialisation du client Spotify (un hôte multi-salles peut ne pas avoir de compte par défaut)
+sp = createSpotify(SPOTIPY_CLIENT_ID, SPOTIPY_CLIENT_SECRET, REDIRECT_URL) if SPOTIPY_CLIENT_ID else None
+
+if sp is not None:
+    sp.user = "s7df1bggy7vp04apvg6dglu0t" #C'est moi wesh
+
+# Client du compte par défaut, et ses méthodes exposées comme fonctions du module
+default_client = SpotifyClient(sp)
+
+getCurrentPlayingTrackSnapshot = default_client.getCurrentPlayingTrackSnapshot
+getQueueSnapshot = default_client.getQueueSnapshot
+getCurrentPlayingTrack = default_client.getCurrentPlayingTrack
+getQueue = default_client.getQueue
+invalidateSnapshots = default_client.invalidateSnapshots
+refreshSnapshots = default_client.refreshSnapshots
+SearchSong = default_client.SearchSong
+getRecentlyPlayed = default_client.getRecentlyPlayed
+getAudioFeatures = default_client.getAudioFeatures
+AddtoQueue = default_client.AddtoQueue
+DeletefromQueue = default_client.DeletefromQueue
+playTrack = default_client.playTrack
+pausePlayback = default_client.pausePlayback
+resumePlayback = default_client.resumePlayback
+nextTrack = default_client.nextTrack
+previousTrack = default_client.previousTrack
+skipTracks = default_client.skipTracks
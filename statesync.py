@@ -0,0 +1,406 @@
+"""
+Protocole compact de synchronisation de l'état de lecture et de la queue.
+
+Un client reçoit d'abord un snapshot complet, puis des deltas binaires
+(insertion, suppression, déplacement, progression, piste en cours). Chaque
+message porte un numéro de séquence : un trou dans la séquence impose de
+redemander un snapshot.
+
+Format (big-endian) :
+    en-tête : b"BT", version (u8), type (u8), séquence (u32)
+    snapshot : progression (u32), lecture (u8), piste en cours, nombre de
+               pistes (u32), pistes, nombre de pistes connues hors queue
+               (u32), pistes connues
+    delta : nombre d'opérations (u32), opérations
+    piste : id (u8 + utf-8), titre, artiste, album (u16 + utf-8), durée (u32)
+"""
+
+import struct
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+PROTOCOL_VERSION = 1
+MAGIC = b"BT"
+
+KIND_SNAPSHOT = 0
+KIND_DELTA = 1
+
+OP_INSERT = 1       # index (u32), piste complète
+OP_INSERT_REF = 2   # index (u32), id d'une piste déjà connue du client
+OP_REMOVE = 3       # index (u32)
+OP_MOVE = 4         # origine (u32), destination (u32)
+OP_PROGRESS = 5     # progression (u32), lecture (u8)
+OP_CURRENT = 6      # présence (u8), puis référence (u8) et piste ou id
+
+# Pistes oubliées tolérées avant de renvoyer un snapshot complet
+KNOWN_IDS_MARGIN = 1000
+
+_HEADER = struct.Struct(">2sBBI")
+_U8 = struct.Struct(">B")
+_U16 = struct.Struct(">H")
+_U32 = struct.Struct(">I")
+_PAIR = struct.Struct(">II")
+_PROGRESS = struct.Struct(">IB")
+
+
+class StateSyncError(Exception):
+    """Message de synchronisation invalide"""
+
+
+class SequenceGapError(StateSyncError):
+    """Un message a été perdu : le client doit demander un nouveau snapshot"""
+
+
+class PlaybackState:
+    """État de lecture à synchroniser (pistes décrites par des dicts)"""
+
+    def __init__(self, current: Optional[Dict] = None, is_playing: bool = False,
+                 progress_ms: int = 0, queue: Optional[List[Dict]] = None):
+        self.current = current
+        self.is_playing = is_playing
+        self.progress_ms = progress_ms
+        self.queue = queue or []
+
+    @classmethod
+    def from_tracks(cls, current, queue: Sequence) -> "PlaybackState":
+        """Construit l'état à partir d'objets Track (ou équivalents)"""
+        return cls(
+            current=track_to_dict(current) if current else None,
+            is_playing=bool(current and current.is_playing),
+            progress_ms=(current.progress_ms or 0) if current else 0,
+            queue=[track_to_dict(track) for track in queue],
+        )
+
+
+def track_to_dict(track) -> Dict:
+    """Extrait les champs synchronisés d'un objet Track"""
+    return {
+        'id': track.id or _local_id(track),
+        'title': track.title,
+        'artist': track.artist,
+        'album': track.album,
+        'duration_ms': track.duration_ms or 0,
+    }
+
+
+def _local_id(track) -> str:
+    """
+    Identifiant de remplacement pour une piste sans id Spotify
+
+    L'API retourne "id": null pour les fichiers locaux : la clé est dérivée des
+    métadonnées, stable d'une lecture à l'autre.
+    """
+    return f"local:{track.artist or ''}:{track.album or ''}:{track.title or ''}"
+
+
+class StateEncoder:
+    """
+    Produit les messages côté serveur
+
+    update() retourne le message à diffuser à tous les clients ;
+    snapshot() sert un client qui se connecte ou qui doit se resynchroniser,
+    sans faire avancer la séquence des autres.
+    """
+
+    def __init__(self):
+        self.seq = 0
+        self._state = PlaybackState()
+        self._queue_ids: List[str] = []
+        # Pistes déjà envoyées, par id, avec leur encodage (réutilisé par les snapshots)
+        self._known: Dict[str, bytes] = {}
+
+    def snapshot(self) -> bytes:
+        """Encode l'état complet au numéro de séquence courant"""
+        state = self._state
+        parts = [_HEADER.pack(MAGIC, PROTOCOL_VERSION, KIND_SNAPSHOT, self.seq),
+                 _PROGRESS.pack(state.progress_ms, state.is_playing)]
+        if state.current is None:
+            parts.append(_U8.pack(0))
+        else:
+            parts.append(_U8.pack(1) + _U8.pack(0) + self._encode_track(state.current))
+        parts.append(_U32.pack(len(state.queue)))
+        parts.extend(self._encode_track(track) for track in state.queue)
+
+        # Pistes que les prochains deltas pourront désigner par leur id seul
+        listed = set(self._queue_ids)
+        if state.current:
+            listed.add(state.current['id'])
+        extra = [encoded for track_id, encoded in self._known.items() if track_id not in listed]
+        parts.append(_U32.pack(len(extra)))
+        parts.extend(extra)
+        return b"".join(parts)
+
+    def update(self, state: PlaybackState) -> Optional[bytes]:
+        """
+        Enregistre le nouvel état et encode les changements à diffuser
+
+        Returns:
+            Un delta, un snapshot (premier message, ou pour que les clients
+            oublient les pistes jouées), ou None si rien n'a changé
+        """
+        if not self.seq or len(self._known) > 2 * len(state.queue) + KNOWN_IDS_MARGIN:
+            self.seq += 1
+            # Seules les pistes du snapshot seront connues de tous les clients
+            self._known = {}
+            self._remember(state, [track['id'] for track in state.queue])
+            return self.snapshot()
+
+        ops = []
+        previous = self._state
+        current_id = state.current['id'] if state.current else None
+        previous_id = previous.current['id'] if previous.current else None
+        if current_id != previous_id:
+            ops.append(_U8.pack(OP_CURRENT) + self._encode_current(state.current))
+        if state.progress_ms != previous.progress_ms or state.is_playing != previous.is_playing:
+            ops.append(_U8.pack(OP_PROGRESS) + _PROGRESS.pack(state.progress_ms, state.is_playing))
+
+        new_ids = [track['id'] for track in state.queue]
+        if new_ids != self._queue_ids:
+            ops.extend(self._queue_ops(self._queue_ids, new_ids, state.queue))
+
+        if not ops:
+            return None
+        self.seq += 1
+        self._remember(state, new_ids)
+        header = _HEADER.pack(MAGIC, PROTOCOL_VERSION, KIND_DELTA, self.seq)
+        return header + _U32.pack(len(ops)) + b"".join(ops)
+
+    def _queue_ops(self, old_ids: List[str], new_ids: List[str], queue: List[Dict]) -> List[bytes]:
+        ops = []
+
+        # Seule la partie entre le préfixe et le suffixe communs est comparée
+        prefix = _common_prefix(old_ids, new_ids)
+        suffix = _common_suffix(old_ids[prefix:], new_ids[prefix:]) if prefix < len(old_ids) else 0
+        old_ids = old_ids[prefix:len(old_ids) - suffix]
+        new_ids = new_ids[prefix:len(new_ids) - suffix]
+
+        # Suppressions d'abord, de la fin vers le début pour garder les index valides
+        remaining = Counter(new_ids)
+        removed = []
+        for index, track_id in enumerate(old_ids):
+            if remaining[track_id] > 0:
+                remaining[track_id] -= 1
+            else:
+                removed.append(index)
+        current = list(old_ids)
+        for index in reversed(removed):
+            ops.append(_U8.pack(OP_REMOVE) + _U32.pack(prefix + index))
+            del current[index]
+
+        # Puis insertions et déplacements, position par position
+        for index, track_id in enumerate(new_ids):
+            if index < len(current) and current[index] == track_id:
+                continue
+            try:
+                origin = current.index(track_id, index + 1)
+            except ValueError:
+                ops.append(_U8.pack(OP_INSERT_REF if track_id in self._known else OP_INSERT)
+                           + _U32.pack(prefix + index) + self._encode_ref(queue[prefix + index]))
+                current.insert(index, track_id)
+            else:
+                ops.append(_U8.pack(OP_MOVE) + _PAIR.pack(prefix + origin, prefix + index))
+                current.insert(index, current.pop(origin))
+        return ops
+
+    def _encode_current(self, track: Optional[Dict]) -> bytes:
+        if track is None:
+            return _U8.pack(0)
+        if track['id'] in self._known:
+            return _U8.pack(1) + _U8.pack(1) + _encode_id(track['id'])
+        return _U8.pack(1) + _U8.pack(0) + self._encode_track(track)
+
+    def _encode_ref(self, track: Dict) -> bytes:
+        if track['id'] in self._known:
+            return _encode_id(track['id'])
+        return self._encode_track(track)
+
+    def _encode_track(self, track: Dict) -> bytes:
+        encoded = self._known.get(track['id'])
+        if encoded is None:
+            encoded = b"".join((
+                _encode_id(track['id']),
+                _encode_text(track.get('title', '')),
+                _encode_text(track.get('artist', '')),
+                _encode_text(track.get('album', '')),
+                _U32.pack(track.get('duration_ms') or 0),
+            ))
+            self._known[track['id']] = encoded
+        return encoded
+
+    def _remember(self, state: PlaybackState, queue_ids: List[str]):
+        self._state = state
+        self._queue_ids = queue_ids
+
+
+class StateDecoder:
+    """Reconstruit l'état côté client à partir des messages reçus"""
+
+    def __init__(self):
+        self.seq: Optional[int] = None
+        self.current_id: Optional[str] = None
+        self.is_playing = False
+        self.progress_ms = 0
+        self.queue_ids: List[str] = []
+        self.tracks: Dict[str, Dict] = {}  # Métadonnées des pistes, par id
+
+    @property
+    def synced(self) -> bool:
+        return self.seq is not None
+
+    @property
+    def current(self) -> Optional[Dict]:
+        return self.tracks.get(self.current_id) if self.current_id else None
+
+    @property
+    def queue(self) -> List[Dict]:
+        return [self.tracks[track_id] for track_id in self.queue_ids]
+
+    def apply(self, payload: bytes):
+        """
+        Applique un snapshot ou un delta
+
+        Raises:
+            SequenceGapError: Si un message a été manqué (l'état n'est pas modifié)
+            StateSyncError: Si le message est invalide
+        """
+        try:
+            magic, version, kind, seq = _HEADER.unpack_from(payload, 0)
+        except struct.error as e:
+            raise StateSyncError(f"En-tête invalide: {e}")
+        if magic != MAGIC or version != PROTOCOL_VERSION:
+            raise StateSyncError(f"Message non supporté (version {version})")
+
+        reader = _Reader(payload, _HEADER.size)
+        try:
+            if kind == KIND_SNAPSHOT:
+                self._apply_snapshot(reader)
+            elif kind == KIND_DELTA:
+                if self.seq is None or seq != self.seq + 1:
+                    raise SequenceGapError(f"Séquence {seq} reçue, {self._expected()} attendue")
+                self._apply_delta(reader)
+            else:
+                raise StateSyncError(f"Type de message inconnu: {kind}")
+        except (struct.error, IndexError, KeyError) as e:
+            # État partiellement appliqué : seul un snapshot peut le réparer
+            self.seq = None
+            raise StateSyncError(f"Message corrompu: {e}")
+        self.seq = seq
+
+    def _expected(self) -> str:
+        return "un snapshot" if self.seq is None else str(self.seq + 1)
+
+    def _apply_snapshot(self, reader: "_Reader"):
+        self.tracks = {}
+        self.progress_ms, is_playing = reader.unpack(_PROGRESS)
+        self.is_playing = bool(is_playing)
+        self.current_id = self._read_current(reader)
+        count, = reader.unpack(_U32)
+        self.queue_ids = [self._read_track(reader) for _ in range(count)]
+        count, = reader.unpack(_U32)
+        for _ in range(count):
+            self._read_track(reader)
+
+    def _apply_delta(self, reader: "_Reader"):
+        count, = reader.unpack(_U32)
+        for _ in range(count):
+            op, = reader.unpack(_U8)
+            if op == OP_INSERT:
+                index, = reader.unpack(_U32)
+                self.queue_ids.insert(index, self._read_track(reader))
+            elif op == OP_INSERT_REF:
+                index, = reader.unpack(_U32)
+                self.queue_ids.insert(index, self._read_known_id(reader))
+            elif op == OP_REMOVE:
+                index, = reader.unpack(_U32)
+                del self.queue_ids[index]
+            elif op == OP_MOVE:
+                origin, destination = reader.unpack(_PAIR)
+                self.queue_ids.insert(destination, self.queue_ids.pop(origin))
+            elif op == OP_PROGRESS:
+                self.progress_ms, is_playing = reader.unpack(_PROGRESS)
+                self.is_playing = bool(is_playing)
+            elif op == OP_CURRENT:
+                self.current_id = self._read_current(reader)
+            else:
+                raise StateSyncError(f"Opération inconnue: {op}")
+
+    def _read_current(self, reader: "_Reader") -> Optional[str]:
+        present, = reader.unpack(_U8)
+        if not present:
+            return None
+        is_ref, = reader.unpack(_U8)
+        return self._read_known_id(reader) if is_ref else self._read_track(reader)
+
+    def _read_known_id(self, reader: "_Reader") -> str:
+        track_id = reader.read_id()
+        if track_id not in self.tracks:
+            raise KeyError(track_id)
+        return track_id
+
+    def _read_track(self, reader: "_Reader") -> str:
+        track_id = reader.read_id()
+        title = reader.read_text()
+        artist = reader.read_text()
+        album = reader.read_text()
+        duration_ms, = reader.unpack(_U32)
+        self.tracks[track_id] = {
+            'id': track_id,
+            'title': title,
+            'artist': artist,
+            'album': album,
+            'duration_ms': duration_ms,
+        }
+        return track_id
+
+
+class _Reader:
+    """Curseur de lecture sur un message binaire"""
+
+    def __init__(self, payload: bytes, offset: int):
+        self.payload = payload
+        self.offset = offset
+
+    def unpack(self, layout: struct.Struct):
+        values = layout.unpack_from(self.payload, self.offset)
+        self.offset += layout.size
+        return values
+
+    def read_id(self) -> str:
+        length, = self.unpack(_U8)
+        return self._read_bytes(length).decode("utf-8", errors="replace")
+
+    def read_text(self) -> str:
+        length, = self.unpack(_U16)
+        # Le texte a pu être tronqué au milieu d'un caractère multi-octets
+        return self._read_bytes(length).decode("utf-8", errors="replace")
+
+    def _read_bytes(self, length: int) -> bytes:
+        end = self.offset + length
+        if end > len(self.payload):
+            raise IndexError("message tronqué")
+        data = self.payload[self.offset:end]
+        self.offset = end
+        return data
+
+
+def _common_prefix(a: List[str], b: List[str]) -> int:
+    """Longueur du préfixe commun"""
+    for index, (left, right) in enumerate(zip(a, b)):
+        if left != right:
+            return index
+    return min(len(a), len(b))
+
+
+def _common_suffix(a: List[str], b: List[str]) -> int:
+    """Longueur du suffixe commun"""
+    return _common_prefix(a[::-1], b[::-1])
+
+
+def _encode_id(track_id: str) -> bytes:
+    data = track_id.encode("utf-8")[:255]
+    return _U8.pack(len(data)) + data
+
+
+def _encode_text(text: str) -> bytes:
+    data = (text or '').encode("utf-8")[:65535]
+    return _U16.pack(len(data)) + data